@@ -0,0 +1,114 @@
+"""Contains batch solving of many orders against one warehouse, which is loaded only once."""
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from warehouse import Warehouse
+from listvar import QuietVar
+# the algorithms that run in one process can be used for batch solving
+from solve import algorithm_lookup, search_arguments
+
+
+def read_orders(source):
+    """
+    Streams orders from a directory (one order file per order) or a file with one order per line
+
+    :param source: directory or file path
+    :return: generator of (name, list of ordered items)
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                with open(path) as f:
+                    yield name, f.read().split()
+    else:
+        with open(source) as f:
+            for line_nr, line in enumerate(f, 1):
+                if line.strip():
+                    yield f"{os.path.basename(source)}:{line_nr}", line.split()
+
+
+def solve_orders(warehouse, orders, algorithm = "hillclimbing", args = (), processes = None, cache = True):
+    """
+    Solves many orders against one warehouse in a process pool. Every worker loads the warehouse once, from the
+    compiled binary cache the workers share its memory pages.
+
+    :param warehouse: path of the warehouse file
+    :param orders: iterable of (name, list of ordered items), e.g. from read_orders
+    :param algorithm: name of the algorithm, see algorithm_lookup
+    :param args: arguments of the algorithm's search method
+    :param processes: number of worker processes, defaults to the number of cores
+    :param cache: load the warehouse from its compiled binary cache
+    :return: generator of result dicts, in the order in which they finish
+    """
+    if cache:
+        # compile once in the main process instead of in every worker
+        Warehouse.load(warehouse)
+
+    with Pool(processes, initializer = _init_worker, initargs = (warehouse, cache)) as pool:
+        jobs = ((name, order_raw, algorithm, args) for name, order_raw in orders)
+
+        for result in pool.imap_unordered(_solve, jobs):
+            yield result
+
+
+# warehouse of a worker process, set by _init_worker
+_warehouse = None
+
+def _init_worker(warehouse, cache):
+    global _warehouse
+    _warehouse = Warehouse.load(warehouse, cache)
+
+
+def _solve(job):
+    """
+    Solves one order in a worker process
+    :param job: name of the order, list of ordered items, algorithm name and search arguments
+    :return: result dict with the value and the used psu-nrs, or the error
+    """
+    name, order_raw, algorithm, args = job
+    t = time.time()
+
+    try:
+        quiet = QuietVar()
+        alg = algorithm_lookup[algorithm].from_problem(*_warehouse.order_problem(order_raw), quiet, quiet)
+        state = alg.search(*args)
+    except Exception as err:
+        return {"order": name, "error": repr(err)}
+
+    return {
+        "order": name,
+        "value": int(alg.value_function(state)),
+        "psus": [int(psu_nr) + 1 for psu_nr in alg.psu_nrs[state]],
+        "seconds": time.time() - t,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Solves many orders against one warehouse. "
+                                                   "Prints one JSON result per line as soon as it is finished.")
+    parser.add_argument("warehouse", help = "warehouse file")
+    parser.add_argument("orders", help = "directory with one order file per order, or file with one order per line")
+    parser.add_argument("--algorithm", choices = list(algorithm_lookup), default = "hillclimbing")
+    parser.add_argument("--k", type = int, default = 4, help = "number of beams for local beam search, number of climbs for vectorized hillclimbing")
+    parser.add_argument("--processes", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--no-cache", action = "store_true", help = "parse the warehouse file in every worker")
+    arguments = parser.parse_args()
+
+    search_args = search_arguments(arguments.algorithm, arguments.k)
+
+    t = time.time()
+    n_orders = 0
+
+    for result in solve_orders(arguments.warehouse, read_orders(arguments.orders), arguments.algorithm,
+                               search_args, arguments.processes, not arguments.no_cache):
+        print(json.dumps(result), flush = True)
+        n_orders += 1
+
+    t = time.time() - t
+    print(f"Solved {n_orders} orders in {t:.2f}s ({n_orders / t:.1f} orders per second)", file = sys.stderr)
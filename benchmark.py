@@ -0,0 +1,311 @@
+"""Contains a headless benchmark that compares all search algorithms on the data files and on generated instances."""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from search import Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, Simulated_Annealing, \
+    Vectorized_Hillclimbing
+from parallel_hillclimbing import Parallel_Hillclimbing
+from warehouse import read_problem, Warehouse
+from listvar import QuietVar
+from instrumentation import Instrumentation
+from bounds import lower_bound
+from valuecache import LRU_Value_Cache
+from solve import start_strategies, start_strategy
+from microbenchmark import test_data_module
+
+
+# label, algorithm class and search arguments of every benchmarked configuration
+algorithms = [
+    ("Hillclimbing", Hill_Climbing, ()),
+    ("First Choice Hillclimbing", First_Choice_Hill_Climbing, ()),
+    ("Local Beam Search (k=4)", Local_Beam_Search, (4,)),
+    ("Simulated Annealing", Simulated_Annealing, ()),
+    ("Parallel Hillclimbing (k=2)", Parallel_Hillclimbing, (2,)),
+    ("Parallel Hillclimbing (k=4)", Parallel_Hillclimbing, (4,)),
+    ("Parallel Hillclimbing (k=8)", Parallel_Hillclimbing, (8,)),
+    ("Vectorized Hillclimbing (k=8)", Vectorized_Hillclimbing, (8,)),
+    ("Vectorized Hillclimbing (k=100)", Vectorized_Hillclimbing, (100,)),
+]
+
+# number of items, psus and ordered items, and the smallest and largest psu size of the generated instances,
+# see create_test_data.create_instance
+generated_sizes = {
+    "small": (100, 55, 10, 1, 33),
+    "medium": (1000, 500, 30, 1, 100),
+    "large": (10000, 5000, 100, 1, 200),
+}
+
+# fields of every result row
+fields = ["instance", "algorithm", "repetition", "seed", "n_psus", "n_order_items", "n_searched_psus", "value", "lower_bound", "gap", "seconds",
+          "evaluations", "evaluations_per_second", "iterations", "cache_hits", "cache_misses", "evaluate_seconds", "select_seconds", "peak_memory_bytes", "error"]
+
+
+def data_instances(directory = "data"):
+    """
+    Finds all pairs of warehouse and order files in a directory.
+    problemX.txt belongs to orderX*.txt, problem_X.txt belongs to order_X.txt
+
+    :param directory: directory path
+    :return: list of (name, warehouse path, order path)
+    """
+    instances = []
+
+    for warehouse in sorted(glob.glob(os.path.join(directory, "problem*.txt"))):
+        suffix = os.path.basename(warehouse)[len("problem"):-len(".txt")]
+
+        for order in sorted(glob.glob(os.path.join(directory, f"order{suffix}*.txt"))):
+            if suffix.startswith("_") and order != os.path.join(directory, f"order{suffix}.txt"):
+                continue
+            instances.append((os.path.basename(order)[:-len(".txt")], warehouse, order))
+
+    return instances
+
+
+def generate_problem(n_items, n_psus, order_size, min_psu_size, max_psu_size, seed):
+    """
+    Generates a random problem in memory, in the form returned by read_problem. The instance is the one
+    data/create_test_data.py writes for the same arguments, so that both benchmarks use the same kind of instances.
+
+    :param n_items: number of items in the warehouse
+    :param n_psus: number of psus in the warehouse
+    :param order_size: number of ordered items
+    :param min_psu_size: minimal number of items per psu
+    :param max_psu_size: maximal number of items per psu
+    :param seed: random seed
+    :return: list of items, binary representation of the order, 2D array containing the relevant psus
+             and the psu-nrs of the relevant psus
+    """
+    indptr, indices, order = test_data_module().create_instance(n_items, n_psus, order_size, min_psu_size,
+                                                                max_psu_size, seed = seed)
+    items = np.array([f"Item_{number}" for number in range(n_items)])
+
+    return Warehouse(items, indptr, indices.astype(np.int32)).problem(np.sort(order))
+
+
+def prepare(cls, problem, seed, instrumentation, reduce = False, stop_at_bound = False, value_cache_bytes = 0,
+            start_strategy = None):
+    """
+    Seeds the random generators and creates a search, see run for the parameters
+
+    :return: search object
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    quiet = QuietVar()
+    alg = cls.from_problem(*problem, log_var = quiet, window = quiet, instrumentation = instrumentation,
+                           reduce = reduce)
+    if start_strategy is not None:
+        alg.set_start_strategy(start_strategy)
+    if stop_at_bound:
+        alg.set_target_value()
+    if value_cache_bytes > 0:
+        alg.set_value_cache(LRU_Value_Cache(value_cache_bytes))
+
+    return alg
+
+
+def peak_memory(cls, args, problem, seed, reduce = False, stop_at_bound = False, value_cache_bytes = 0,
+                start_strategy = None):
+    """
+    Repeats a run with the same seed while tracing the memory allocations. Tracing slows the searches down unevenly,
+    so it is done in this extra, untimed run.
+
+    :return: peak memory of the search in bytes, in this process only, worker processes are not included
+    """
+    alg = prepare(cls, problem, seed, Instrumentation(), reduce, stop_at_bound, value_cache_bytes, start_strategy)
+
+    tracemalloc.start()
+    try:
+        alg.search(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        alg.close()
+
+
+def run(cls, args, problem, seed, profile = False, reduce = False, stop_at_bound = False, value_cache_bytes = 0,
+        start_strategy = None, measure_memory = True):
+    """
+    Runs one search and measures it
+
+    :param cls: algorithm class
+    :param args: search arguments
+    :param problem: problem as returned by read_problem
+    :param seed: random seed
+    :param profile: print a cProfile profile of the search
+    :param reduce: search the reduced problem, see reduction.Reduction
+    :param stop_at_bound: stop the search as soon as it reaches the lower bound, see Abstract_Search.set_target_value
+    :param value_cache_bytes: memory cap of a value cache in front of value_function, 0 for no cache
+    :param start_strategy: creates the start states, see Abstract_Search.set_start_strategy, random if not given
+    :param measure_memory: measure the peak memory in a second run, see peak_memory
+    :return: dict with the measurements, or with the error if the search failed
+    """
+    instrumentation = Instrumentation(timed = True, profile = profile)
+    alg = prepare(cls, problem, seed, instrumentation, reduce, stop_at_bound, value_cache_bytes, start_strategy)
+
+    t = time.perf_counter()
+
+    try:
+        with instrumentation.profiling():
+            state = alg.search(*args)
+    except Exception as err:
+        return {"n_psus": len(problem[2]), "n_order_items": problem[2].shape[1], "n_searched_psus": len(alg.psus),
+                "error": repr(err)}
+    finally:
+        t = time.perf_counter() - t
+        alg.close()
+
+    if profile:
+        print(instrumentation.profile_stats())
+
+    evaluations = alg.counters["evaluations"]
+
+    return {
+        "n_psus": len(problem[2]),
+        "n_order_items": problem[2].shape[1],
+        "n_searched_psus": len(alg.psus),
+        "value": int(alg.original_value(state)),
+        "seconds": t,
+        "evaluations": evaluations,
+        "evaluations_per_second": evaluations / t if t > 0 else 0,
+        "iterations": alg.counters["iterations"],
+        "cache_hits": alg.counters["cache_hits"],
+        "cache_misses": alg.counters["cache_misses"],
+        "evaluate_seconds": instrumentation.phase_times["evaluate"],
+        "select_seconds": instrumentation.phase_times["select"],
+        "peak_memory_bytes": peak_memory(cls, args, problem, seed, reduce, stop_at_bound, value_cache_bytes,
+                                         start_strategy) if measure_memory else None,
+        "error": None,
+    }
+
+
+def benchmark(instances, configurations = algorithms, repetitions = 3, seed = 0, profile = False, reduce = False,
+              stop_at_bound = False, node_limit = 10000, value_cache_bytes = 0, start_strategy = None,
+              measure_memory = True):
+    """
+    Runs every configuration on every instance
+
+    :param instances: list of (name, problem)
+    :param configurations: list of (label, algorithm class, search arguments)
+    :param repetitions: number of runs per instance and configuration
+    :param seed: seed of the first repetition, the following repetitions use the next seeds
+    :param profile: print a cProfile profile of every run
+    :param reduce: search the reduced problems, see reduction.Reduction
+    :param stop_at_bound: stop the searches as soon as they reach the lower bound
+    :param node_limit: nodes of the branch and bound for the lower bound of every instance, see bounds.lower_bound
+    :param value_cache_bytes: memory cap of a value cache per run, 0 for no cache
+    :param start_strategy: creates the start states of every run, random if not given
+    :param measure_memory: measure the peak memory of every run in a second, untimed run
+    :return: generator of result rows
+    """
+    for name, problem in instances:
+        bound = lower_bound(problem[2], node_limit)
+
+        for label, cls, args in configurations:
+            for repetition in range(repetitions):
+                result = run(cls, args, problem, seed + repetition, profile, reduce, stop_at_bound,
+                             value_cache_bytes, start_strategy, measure_memory)
+                result["lower_bound"] = bound
+                # psus used more than the lower bound, the value of a state covering the order is n_psus - used psus
+                if result["error"] is None and result["value"] >= 0:
+                    result["gap"] = result["n_psus"] - result["value"] - bound
+
+                yield dict(instance = name, algorithm = label, repetition = repetition, seed = seed + repetition,
+                           **result)
+
+
+def summary(rows):
+    """
+    Returns a table with the mean measurements per instance and algorithm
+    """
+    groups = {}
+    for row in rows:
+        if row["error"] is not None:
+            continue
+        groups.setdefault((row["instance"], row["algorithm"]), []).append(row)
+
+    header = (f"{'instance':<20} {'algorithm':<30} {'value':>9} {'gap':>6} {'seconds':>9} {'evals/s':>11} "
+              f"{'iterations':>10} {'peak MB':>8}")
+    lines = [header, "-" * len(header)]
+
+    for (instance, algorithm), group in groups.items():
+        mean = lambda field: np.mean([row[field] for row in group])
+        # the gap is only known for runs that covered the order
+        gaps = [row["gap"] for row in group if row.get("gap") is not None]
+        gap = f"{np.mean(gaps):>6.1f}" if gaps else f"{'-':>6}"
+        memory = [row["peak_memory_bytes"] for row in group if row["peak_memory_bytes"] is not None]
+        memory = f"{np.mean(memory) / 2 ** 20:>8.2f}" if memory else f"{'-':>8}"
+        lines.append(f"{instance:<20} {algorithm:<30} {mean('value'):>9.1f} {gap} {mean('seconds'):>9.4f} "
+                     f"{mean('evaluations_per_second'):>11.0f} {mean('iterations'):>10.1f} {memory}")
+
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Benchmarks all search algorithms.")
+    parser.add_argument("--data", default = "data", help = "directory with warehouse and order files")
+    parser.add_argument("--sizes", nargs = "*", default = list(generated_sizes), choices = list(generated_sizes),
+                        help = "generated instances to include")
+    parser.add_argument("--no-data", action = "store_true", help = "only use generated instances")
+    parser.add_argument("--algorithms", nargs = "*", default = None, help = "only run these algorithm labels")
+    parser.add_argument("--repetitions", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--profile", action = "store_true", help = "print a cProfile profile of every run")
+    parser.add_argument("--reduce", action = "store_true", help = "search the reduced problems")
+    parser.add_argument("--stop-at-bound", action = "store_true",
+                        help = "stop the searches as soon as they reach the lower bound")
+    parser.add_argument("--nodes", type = int, default = 10000,
+                        help = "node limit of the branch and bound for the lower bounds")
+    parser.add_argument("--value-cache-mb", type = float, default = 0,
+                        help = "memory cap of a value cache per run in MB, 0 for no cache")
+    parser.add_argument("--start", choices = list(start_strategies), default = "random",
+                        help = "how the start states are created")
+    parser.add_argument("--alpha", type = float, default = 0.3,
+                        help = "size of the restricted candidate list of the grasp start and of all but the first "
+                             "greedy start state, 0 is greedy")
+    parser.add_argument("--no-memory", action = "store_true",
+                        help = "skip the second, untimed run of every search that measures the peak memory")
+    parser.add_argument("--output", default = "benchmark_results", help = "prefix of the .csv and .json result files")
+    arguments = parser.parse_args()
+
+    instances = []
+    if not arguments.no_data:
+        instances += [(name, read_problem(warehouse, order)) for name, warehouse, order in data_instances(arguments.data)]
+    instances += [(f"generated_{size}", generate_problem(*generated_sizes[size], seed = arguments.seed))
+                  for size in arguments.sizes]
+
+    configurations = [configuration for configuration in algorithms
+                      if arguments.algorithms is None or configuration[0] in arguments.algorithms]
+
+    rows = []
+    for row in benchmark(instances, configurations, arguments.repetitions, arguments.seed, arguments.profile,
+                         arguments.reduce, arguments.stop_at_bound, arguments.nodes,
+                         int(arguments.value_cache_mb * 2 ** 20), start_strategy(arguments.start, arguments.alpha),
+                         not arguments.no_memory):
+        if row["error"] is None:
+            print(f"{row['instance']:<20} {row['algorithm']:<30} value {row['value']:>6} in {row['seconds']:.4f}s "
+                  f"(gap {row.get('gap', '-')})")
+        else:
+            print(f"{row['instance']:<20} {row['algorithm']:<30} failed: {row['error']}")
+        rows.append(row)
+
+    with open(arguments.output + ".csv", "w", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with open(arguments.output + ".json", "w") as f:
+        json.dump(rows, f, indent = 2)
+
+    print()
+    print(summary(rows))
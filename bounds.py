@@ -0,0 +1,192 @@
+"""Contains lower bounds for the number of psus needed for an order, and an exact branch and bound for small orders."""
+
+import argparse
+
+import numpy as np
+
+from warehouse import read_problem
+
+
+def disjoint_items_bound(psus, items=None, available=None):
+    """
+    Greedily collects ordered items that no psu contains together, every one of them needs its own psu
+
+    :param psus: 2D array containing the psus
+    :param items: binary array of the ordered items to cover, all if not given
+    :param available: binary array of the psus that can be used, all if not given
+    :return: number of collected items, a lower bound for the number of psus needed
+    """
+    if items is not None:
+        psus = psus[:, items]
+    if available is not None:
+        psus = psus[available]
+
+    used = np.zeros(len(psus), dtype=bool)
+    bound = 0
+
+    # items contained in few psus block few other items
+    for item in np.argsort(np.count_nonzero(psus, axis=0), kind="stable"):
+        containing = psus[:, item]
+        if not np.any(containing & used):
+            used |= containing
+            bound += 1
+
+    return bound
+
+
+def dual_bound(psus, iterations=200):
+    """
+    Bounds the LP relaxation of the set cover from below with lagrangian multipliers u >= 0 per ordered item:
+    L(u) = sum(u) + sum over psus of min(0, 1 - sum of u over the items of the psu).
+    The multipliers start from a feasible dual solution and are improved by subgradient steps.
+
+    :param psus: 2D array containing the psus
+    :param iterations: number of subgradient steps
+    :return: lower bound for the number of psus needed (not rounded)
+    """
+    psus_float = psus.astype(np.float64)
+    n_items = psus.shape[1]
+
+    # dual ascent: raise every item's multiplier as far as the psus containing it allow
+    slack = np.ones(len(psus))
+    u = np.zeros(n_items)
+    for item in np.argsort(np.count_nonzero(psus, axis=0), kind="stable"):
+        containing = psus[:, item]
+        u[item] = np.amin(slack[containing], initial=np.inf) if np.any(containing) else 0
+        slack[containing] -= u[item]
+
+    best = np.sum(u)
+    upper = np.count_nonzero(greedy_cover(psus))
+    step = 2.0
+
+    for _ in range(iterations):
+        reduced_costs = 1 - psus_float @ u
+        chosen = reduced_costs < 0
+        value = np.sum(u) + np.sum(reduced_costs[chosen])
+        best = max(best, value)
+
+        if upper - best < 1e-9:
+            break
+
+        # items covered once by the chosen psus are balanced, others push their multiplier up or down
+        subgradient = 1 - np.count_nonzero(psus[chosen], axis=0)
+        norm = np.dot(subgradient, subgradient)
+        if norm == 0:
+            break
+
+        u = np.maximum(u + step * (upper - value) / norm * subgradient, 0)
+        step *= 0.97
+
+    return best
+
+
+def greedy_cover(psus):
+    """
+    Covers the order greedily with the psu containing the most uncovered items
+
+    :param psus: 2D array containing the psus
+    :return: binary array describing used PSUs
+    """
+    state = np.zeros(len(psus), dtype=bool)
+    uncovered = np.any(psus, axis=0)
+
+    while np.any(uncovered):
+        best = np.argmax(np.count_nonzero(psus & uncovered, axis=1))
+        state[best] = True
+        uncovered &= ~psus[best]
+
+    return state
+
+
+def lower_bound(psus, node_limit=0):
+    """
+    Computes a lower bound for the number of psus needed to cover the order
+
+    :param psus: 2D array containing the psus
+    :param node_limit: if > 0, try to solve the order exactly with this many branch and bound nodes
+    :return: lower bound, the exact minimum if the branch and bound finished
+    """
+    # at least one psu is always needed, see value_function
+    bound = max(1, disjoint_items_bound(psus), int(np.ceil(dual_bound(psus) - 1e-6)))
+
+    if node_limit > 0:
+        state, proven = branch_and_bound(psus, node_limit)
+        if proven:
+            return max(1, int(np.count_nonzero(state)))
+
+    return bound
+
+
+def branch_and_bound(psus, node_limit=100000):
+    """
+    Searches the smallest set of psus covering the order. Branches on the uncovered item contained in the fewest
+    psus and prunes with disjoint_items_bound. Meant for small orders, the search stops after node_limit nodes.
+
+    :param psus: 2D array containing the psus
+    :param node_limit: maximal number of visited nodes
+    :return: binary array describing the best found PSUs, and whether it is proven to be optimal
+    """
+    best = greedy_cover(psus)
+    best_count = np.count_nonzero(best)
+    nodes = 0
+
+    def branch(state, available, uncovered):
+        nonlocal best, best_count, nodes
+
+        nodes += 1
+        if nodes > node_limit:
+            return False
+
+        if not np.any(uncovered):
+            if np.count_nonzero(state) < best_count:
+                best, best_count = state.copy(), np.count_nonzero(state)
+            return True
+
+        candidates = psus[:, uncovered] & available[:, np.newaxis]
+        n_containing = np.count_nonzero(candidates, axis=0)
+
+        # an item no available psu contains can't be covered anymore
+        if np.any(n_containing == 0):
+            return True
+
+        if np.count_nonzero(state) + disjoint_items_bound(psus, uncovered, available) >= best_count:
+            return True
+
+        item = np.flatnonzero(uncovered)[np.argmin(n_containing)]
+        containing = np.flatnonzero(psus[:, item] & available)
+
+        # psus covering more uncovered items first, every branch excludes the psus of the previous branches
+        order = np.argsort(-np.count_nonzero(psus[containing] & uncovered, axis=1), kind="stable")
+        available = available.copy()
+
+        for psu in containing[order]:
+            available[psu] = False
+            state[psu] = True
+            finished = branch(state, available, uncovered & ~psus[psu])
+            state[psu] = False
+
+            if not finished:
+                return False
+
+        return True
+
+    proven = branch(np.zeros(len(psus), dtype=bool), np.ones(len(psus), dtype=bool), np.any(psus, axis=0))
+
+    return best, proven
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Shows lower bounds for the number of PSUs needed for an order.")
+    parser.add_argument("warehouse", help = "warehouse file")
+    parser.add_argument("order", help = "order file")
+    parser.add_argument("--nodes", type = int, default = 100000, help = "node limit of the branch and bound")
+    arguments = parser.parse_args()
+
+    psus = read_problem(arguments.warehouse, arguments.order)[2]
+
+    print(f"Disjoint items bound: {disjoint_items_bound(psus)}")
+    print(f"Dual bound: {dual_bound(psus):.3f}")
+    print(f"Greedy cover: {np.count_nonzero(greedy_cover(psus))} PSUs")
+
+    state, proven = branch_and_bound(psus, arguments.nodes)
+    print(f"Branch and bound: {np.count_nonzero(state)} PSUs" + (" (optimal)" if proven else " (node limit reached)"))
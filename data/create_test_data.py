@@ -1,56 +1,171 @@
-import random
-import numpy as np
-
-
-data_size = 100
-psus_number = 55
-order_size = 10
-
-# Create items list
-
-list_items = [f'Item_{number} ' for number in list(range(data_size))]
-#list_items[-1] = list_items[-1].rstrip() 
-
-
-# create PSUs
-
-psus = []
+"""Creates random warehouse and order files in the format read by Abstract_Search."""
 
-for i in range(psus_number):
-    current_psu = set()
-    
-    for j in range(random.randint(1, int(data_size *  2 / 6))):
-        current_psu.add(random.choice(list_items))
+import argparse
+import os
+import time
 
-    current_psu = [f'{elem}' for elem in list(current_psu)]
-    current_psu[-1] = current_psu[-1].rstrip()
-    
-    psus.append(current_psu)
-
-# Create problem file
-
-example_id = str(data_size) + "_items"
-
-                   
-with open(f'problem_{example_id}.txt', 'w+') as problem:
-    problem.writelines(list_items)
-    problem.write("\n")
-
-    for psu in psus:
-        problem.write('\n')
-        problem.writelines(psu)                     
-    
-
-# create order and order file
-
-order = np.random.choice(list_items, order_size, replace=False)
-
-with open(f'order_{example_id}.txt', 'w+') as f:
-    
-    for item in order[:-1]:
-        f.write(item)
+import numpy as np
 
-    order[-1] = order[-1].rstrip()
-    f.write(order[-1])
-    
 
+# number of items, psus and ordered items, smallest and largest psu size of the preset instances
+presets = {
+    "100_items": (100, 55, 10, 1, 33),
+    "1k": (1000, 1000, 20, 1, 50),
+    "10k": (10000, 10000, 50, 1, 50),
+    "100k": (100000, 100000, 100, 1, 50),
+    "1m": (1000000, 1000000, 200, 1, 50),
+}
+
+# number of psus written at once
+chunk_size = 100000
+
+
+def psu_sizes(rng, n_psus, min_psu_size, max_psu_size, distribution = "uniform"):
+    """
+    Draws the number of items of every psu
+
+    :param rng: numpy random generator
+    :param n_psus: number of psus
+    :param min_psu_size: smallest psu size
+    :param max_psu_size: largest psu size
+    :param distribution: "uniform" between the smallest and the largest size, or "geometric" with many small and
+                         few large psus, mean (min_psu_size + max_psu_size) / 4
+    :return: array of psu sizes
+    """
+    if distribution == "uniform":
+        return rng.integers(min_psu_size, max_psu_size + 1, n_psus)
+
+    if distribution == "geometric":
+        mean = max(min_psu_size, (min_psu_size + max_psu_size) / 4)
+        sizes = min_psu_size - 1 + rng.geometric(1 / (mean - min_psu_size + 1), n_psus)
+        return np.minimum(sizes, max_psu_size)
+
+    raise ValueError(f"Unknown psu size distribution: {distribution}")
+
+
+def create_instance(n_items, n_psus, order_size, min_psu_size = 1, max_psu_size = 33, distribution = "uniform",
+                    seed = None):
+    """
+    Creates a random warehouse and order. The items of a psu are distinct, every ordered item is contained in at
+    least one psu.
+
+    :param n_items: number of items in the warehouse
+    :param n_psus: number of psus in the warehouse
+    :param order_size: number of ordered items
+    :param min_psu_size: smallest psu size
+    :param max_psu_size: largest psu size
+    :param distribution: distribution of the psu sizes, see psu_sizes
+    :param seed: random seed
+    :return: CSR structure of the psus (indptr, item positions) and the positions of the ordered items
+    """
+    rng = np.random.default_rng(seed)
+
+    sizes = psu_sizes(rng, n_psus, min(min_psu_size, n_items), min(max_psu_size, n_items), distribution)
+    entry_psus = np.repeat(np.arange(n_psus, dtype = np.int64), sizes)
+    entry_items = rng.integers(0, n_items, len(entry_psus))
+
+    order = rng.choice(n_items, order_size, replace = False)
+
+    # make sure the order can be fulfilled
+    entry_psus = np.concatenate((entry_psus, rng.integers(0, n_psus, order_size)))
+    entry_items = np.concatenate((entry_items, order))
+
+    # sort the entries by psu and remove items drawn twice for the same psu
+    entries = np.sort(entry_psus * n_items + entry_items)
+    entries = entries[np.concatenate(([True], np.diff(entries) != 0))]
+    indptr = np.zeros(n_psus + 1, dtype = np.int64)
+    np.cumsum(np.bincount(entries // n_items, minlength = n_psus), out = indptr[1:])
+
+    return indptr, entries % n_items, order
+
+
+def write_instance(warehouse_path, order_path, n_items, indptr, indices, order):
+    """
+    Writes a warehouse file and an order file: the items in the first line, an empty line and one psu per line,
+    and the ordered items in one line. The psus are written in chunks, so that the text never has to be in memory
+    at once.
+
+    :param warehouse_path: path of the warehouse file
+    :param order_path: path of the order file
+    :param n_items: number of items
+    :param indptr: start of every psu in indices, plus the end of the last psu
+    :param indices: item positions of all psus
+    :param order: positions of the ordered items
+    """
+    names = np.array([f"Item_{number}" for number in range(n_items)], dtype = object)
+    # every item name followed by a space, or by a line break if it ends a psu
+    names_space = names + " "
+    names_newline = names + "\n"
+
+    with open(warehouse_path, "w") as f:
+        f.write(" ".join(names.tolist()))
+        f.write("\n\n")
+
+        for start in range(0, len(indptr) - 1, chunk_size):
+            stop = min(start + chunk_size, len(indptr) - 1)
+            chunk = indices[indptr[start]:indptr[stop]]
+
+            # last item of every non-empty psu in the chunk
+            is_last = np.zeros(len(chunk), dtype = bool)
+            ends = indptr[start + 1:stop + 1] - indptr[start]
+            sizes = np.diff(indptr[start:stop + 1])
+            is_last[ends[sizes > 0] - 1] = True
+            lines = np.where(is_last, names_newline[chunk], names_space[chunk])
+
+            # empty psus are empty lines, otherwise the numbers of all following psus would shift
+            lines = np.insert(lines, ends[sizes == 0], "\n")
+
+            f.write("".join(lines.tolist()))
+
+    with open(order_path, "w") as f:
+        f.write(" ".join(names[order].tolist()))
+
+
+def create_files(name, n_items, n_psus, order_size, min_psu_size = 1, max_psu_size = 33, distribution = "uniform",
+                 seed = None, directory = "."):
+    """
+    Creates problem_<name>.txt and order_<name>.txt in a directory, see create_instance
+
+    :return: paths of the warehouse file and the order file
+    """
+    warehouse_path = os.path.join(directory, f"problem_{name}.txt")
+    order_path = os.path.join(directory, f"order_{name}.txt")
+
+    indptr, indices, order = create_instance(n_items, n_psus, order_size, min_psu_size, max_psu_size,
+                                             distribution, seed)
+    write_instance(warehouse_path, order_path, n_items, indptr, indices, order)
+
+    return warehouse_path, order_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Creates random warehouse and order files, either the preset "
+                                                   "instances or one instance of the given size.")
+    parser.add_argument("--preset", nargs = "*", choices = list(presets), default = None,
+                        help = "preset instances to create, all if no names are given")
+    parser.add_argument("--items", type = int, default = 100, help = "number of items")
+    parser.add_argument("--psus", type = int, default = 55, help = "number of psus")
+    parser.add_argument("--order-size", type = int, default = 10, help = "number of ordered items")
+    parser.add_argument("--min-psu-size", type = int, default = 1)
+    parser.add_argument("--max-psu-size", type = int, default = 33)
+    parser.add_argument("--distribution", choices = ["uniform", "geometric"], default = "uniform",
+                        help = "distribution of the psu sizes")
+    parser.add_argument("--name", default = None, help = "files are named problem_<name>.txt and order_<name>.txt")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--output", default = ".", help = "directory of the created files")
+    arguments = parser.parse_args()
+
+    if arguments.preset is not None:
+        instances = [(name, *presets[name]) for name in (arguments.preset or presets)]
+    else:
+        name = arguments.name or f"{arguments.items}_items"
+        instances = [(name, arguments.items, arguments.psus, arguments.order_size, arguments.min_psu_size,
+                      arguments.max_psu_size)]
+
+    os.makedirs(arguments.output, exist_ok = True)
+
+    for name, *size in instances:
+        t = time.time()
+        paths = create_files(name, *size, distribution = arguments.distribution, seed = arguments.seed,
+                             directory = arguments.output)
+        print(f"created {paths[0]} and {paths[1]} in {time.time() - t:.2f}s")
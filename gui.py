@@ -1,4 +1,4 @@
-"""Main executable file. Contains the logic for the graphical user interface. Always run this file."""
+"""Main executable file. Contains the logic for the graphical user interface. See solve.py for solving without it."""
 
 import matplotlib
 matplotlib.use("TkAgg")
@@ -6,14 +6,19 @@ matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 
+import queue
+import threading
+import time
+
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
 
-from search import Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, Simulated_Annealing
+from search import Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, Simulated_Annealing, \
+    Vectorized_Hillclimbing
 from parallel_hillclimbing import Parallel_Hillclimbing
 
-from listvar import ListVar
+from listvar import QueueVar
 
 # configuration of text output of the io
 start_string = "Edmund Hillary welcomes you and invites you to find a local search solution for" \
@@ -22,6 +27,11 @@ start_string = "Edmund Hillary welcomes you and invites you to find a local sear
                     "will be displayed in this text field."
 end_string = "\n\nFeel free to try another configuration."
 err_string = "Please input correct files!\n\n\n"
+cancel_string = "The search was cancelled, this is the best solution found so far.\n\n"
+
+# how often the search thread's values are collected and how often the graph is redrawn, in ms
+poll_interval = 50
+redraw_interval = 200
 
 def ask_filename(title, output_var):
     # on-click handler for open-buttons
@@ -31,92 +41,116 @@ def ask_filename(title, output_var):
     if path != "": output_var.set(path)
 
 def start_algorithm():
-    global value_history
+    global search_var
 
     # on-click handler for start button
 
     button_start["text"] = "Running..."
     button_start["state"] = "disabled"
-
-    w.update()
+    button_cancel["state"] = "normal"
 
     alg_string = var_algorithm.get()
     AlgorithmClass = algorithm_lookup[alg_string]
 
-
     # reset graph history
-    value_history = []
-    try:
-        if alg_string != "Local Beam Search" and alg_string != "Parallel Hillclimbing":
-
-            # variable that the search algorithms can write to, to communicate the value-function change over time
-            var_algorithm_status = tk.IntVar(w)
-            # add on-change handler for updating the graph
-            var_algorithm_status.trace("w", lambda *args: update_graph([var_algorithm_status.get()]))
+    for line in lines:
+        line.remove()
+    lines.clear()
+    curves.clear()
+    update_graph()
 
-            alg = AlgorithmClass(var_warehouse_path.get(), var_order_path.get(), var_algorithm_status, w)
-            result = alg.search()
+    # the search runs in a background thread and reports its values through this variable and queue
+    search_var = QueueVar(search_queue)
 
-        else:
+    if alg_string not in ("Local Beam Search", "Parallel Hillclimbing", "Vectorized Hillclimbing"):
+        args = ()
+    else:
+        # for local beam search and parallel / vectorized hillclimbing the number of beams / threads is needed
+        args = (var_threads.get(),)
 
-            # for local beam search and parallel hillclimbing we need a variable that can handle lists
-            var_algorithm_status = ListVar(4)
-            # again add on-change handler
-            var_algorithm_status.trace(lambda: update_graph(var_algorithm_status.get()))
+    thread = threading.Thread(target = run_search, daemon = True,
+        args = (AlgorithmClass, var_warehouse_path.get(), var_order_path.get(), args, search_var, search_queue))
+    thread.start()
 
-            alg = AlgorithmClass(var_warehouse_path.get(), var_order_path.get(),
-                var_algorithm_status, w
-            )
+    w.after(poll_interval, poll_queue)
 
-            result = alg.search(var_threads.get())
 
-        text_status["state"] = "normal"
-        text_status.delete("1.0", tk.END)
-        text_status.insert(tk.END, alg.print_solution(result) + end_string)
-        text_status["state"] = "disabled"
+def run_search(AlgorithmClass, warehouse, order, args, var, queue):
+    # runs in the background thread, must not touch any widgets
 
-        button_start["state"] = "normal"
-        button_start["text"] = "Start"
+    alg = None
+    try:
+        alg = AlgorithmClass(warehouse, order, var, var)
+        alg.set_budget(cancel = var)
+        result = alg.search(*args)
+        queue.put(("done", (cancel_string if alg.stopped() else "") + alg.print_solution(result) + end_string))
 
     # if a wrong warehouse or order is inserted
     except Exception as err:
-        text_status["state"] = "normal"
-        text_status.delete("1.0", tk.END)
-        text_status.insert(tk.END, err_string + start_string)
-        text_status["state"] = "disabled"
+        queue.put(("done", err_string + start_string))
 
-        button_start["state"] = "normal"
-        button_start["text"] = "Start"
-widget_plot = None
+    finally:
+        if alg is not None: alg.close()
 
-def update_graph(value = None):
-    # updates the graph with a new value
-    # works by just creating a new graph, which is slow, but the alternative is annoying to implement
 
-    global widget_plot
+def cancel_algorithm():
+    # on-click handler for cancel button
 
-    if value is not None: value_history.append(value)
+    search_var.cancel()
+    button_cancel["state"] = "disabled"
 
-    ax.clear()
 
-    ax.set_xlabel("Iteration")
-    ax.set_ylabel("Value function")
+def poll_queue():
+    # collects the values reported by the search thread and updates the graph at most every redraw_interval ms
+    global last_redraw
 
-    zipped = zip(*value_history)
+    done = None
 
-    for curve in zipped:
-        ax.plot(range(len(curve)), curve)
-        ax.plot(range(len(curve)), [0] * len(curve), linestyle = "-.")
+    while True:
+        try:
+            kind, content = search_queue.get_nowait()
+        except queue.Empty:
+            break
 
-    canvas = FigureCanvasTkAgg(fig, master = frame_graph)
-    canvas.draw()
+        if kind == "value":
+            # one curve per reported value
+            for index, value in enumerate(content):
+                if index == len(curves): curves.append([])
+                curves[index].append(value)
+        else:
+            done = content
 
-    old_widget = widget_plot
+    now = time.time()
+    if done is not None or now - last_redraw > redraw_interval / 1000:
+        update_graph()
+        last_redraw = now
 
-    widget_plot = canvas.get_tk_widget()
-    widget_plot.grid(row = 0, column = 0, columnspan = 2)
+    if done is None:
+        w.after(poll_interval, poll_queue)
+        return
 
-    if old_widget is not None: old_widget.destroy()
+    text_status["state"] = "normal"
+    text_status.delete("1.0", tk.END)
+    text_status.insert(tk.END, done)
+    text_status["state"] = "disabled"
+
+    button_start["state"] = "normal"
+    button_start["text"] = "Start"
+    button_cancel["state"] = "disabled"
+
+
+def update_graph():
+    # updates the graph by setting the extended curves as data of the existing lines
+
+    while len(lines) < len(curves):
+        lines.append(ax.plot([], [])[0])
+
+    for line, curve in zip(lines, curves):
+        line.set_data(range(len(curve)), curve)
+
+    ax.relim()
+    ax.autoscale_view()
+    canvas.draw_idle()
 
 
 if __name__ == "__main__":
@@ -140,6 +174,7 @@ if __name__ == "__main__":
         "Local Beam Search": Local_Beam_Search,
         "Simulated Annealing with final Hillclimb": Simulated_Annealing,
         "Parallel Hillclimbing": Parallel_Hillclimbing,
+        "Vectorized Hillclimbing": Vectorized_Hillclimbing,
     }
 
     var_algorithm = tk.StringVar(w)
@@ -194,7 +229,7 @@ if __name__ == "__main__":
     label_threads = tk.Label(frame_controls, text = "Threads / Beams:", bg = "white")
     label_threads.grid(row = 5, column = 0, pady = (10, 0), sticky = "EW")
 
-    option_threads = ttk.OptionMenu(frame_controls, var_threads, 4, *range(1, 11))
+    option_threads = ttk.OptionMenu(frame_controls, var_threads, 4, *range(1, 11), 20, 50, 100, 200, 500)
     option_threads.grid(row = 5, column = 1, pady = (10, 0), sticky = "EW")
 
     # text area for displaying the result of the algorithm
@@ -207,19 +242,37 @@ if __name__ == "__main__":
 
     # button for running the selected algorithm
     button_start = ttk.Button(frame_controls, text = "Start", command = start_algorithm)
-    button_start.grid(row = 7, columnspan = 2, pady = (5, 0), sticky = "WE")
+    button_start.grid(row = 7, column = 0, pady = (5, 0), sticky = "WE")
+
+    # button for cancelling the running algorithm
+    button_cancel = ttk.Button(frame_controls, text = "Cancel", command = cancel_algorithm)
+    button_cancel.grid(row = 7, column = 1, pady = (5, 0), sticky = "WE")
+    button_cancel["state"] = "disabled"
 
     # GRAPH
 
     # create Figure and Axes object
-    value_history = []
+    curves = []
     fig = Figure(figsize = (6, 6))
     fig.set_tight_layout(True)
 
     ax = fig.add_subplot(1, 1, 1)
+    ax.set_xlabel("Iteration")
+    ax.set_ylabel("Value function")
+    ax.axhline(0, linestyle = "-.")
 
-    # call update_graph once to initialize the widget
-    update_graph()
+    # one line per value reported by the search, extended while the search runs
+    lines = []
+
+    # the canvas is created once, updates only redraw it
+    canvas = FigureCanvasTkAgg(fig, master = frame_graph)
+    canvas.get_tk_widget().grid(row = 0, column = 0, columnspan = 2)
+    canvas.draw()
+
+    # communication with the search thread
+    search_queue = queue.Queue()
+    search_var = None
+    last_redraw = 0
 
 
 
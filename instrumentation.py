@@ -0,0 +1,103 @@
+"""Contains the instrumentation of the search algorithms: counters, phase timers, per-iteration callbacks and profiling."""
+
+import io
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+
+class Instrumentation():
+    """
+    Is shared by a search object and everything it evaluates with. Counters are always collected, they only cost a
+    dict update. Phase times, callbacks and profiling are off unless requested and cost close to nothing then.
+    """
+    def __init__(self, timed = False, callbacks = None, profile = False):
+        """
+        :param timed: measure the time spent in the phases (parse, reduce, bound, start, evaluate, select)
+        :param callbacks: functions called with (search, iteration, value) after every iteration
+        :param profile: capture a cProfile profile inside profiling()
+        """
+        self.counters = Counter()
+        self.phase_times = Counter()
+        self.timed = timed
+        self.callbacks = list(callbacks or [])
+        self.profiler = None
+        if profile:
+            # only imported when profiling is requested
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def phase(self, name):
+        """
+        Returns a context manager that adds the time spent inside it to a phase
+
+        :param name: name of the phase
+        """
+        if not self.timed:
+            return _no_phase
+
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - t
+
+    def iteration(self, search, iteration, value):
+        """
+        Calls the per-iteration callbacks
+
+        :param search: search object
+        :param iteration: number of the iteration
+        :param value: value (or list of values) after the iteration
+        """
+        for callback in self.callbacks:
+            callback(search, iteration, value)
+
+    def profiling(self):
+        """
+        Returns a context manager that profiles the code inside it, if profiling was requested
+        """
+        if self.profiler is None:
+            return _no_phase
+
+        return self._profiling()
+
+    @contextmanager
+    def _profiling(self):
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def profile_stats(self, limit = 20):
+        """
+        :param limit: number of functions to list
+        :return: the profile sorted by cumulative time as a string, None if profiling was not requested
+        """
+        if self.profiler is None:
+            return None
+
+        import pstats
+
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream = output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def merge(self, counters, phase_times):
+        """
+        Adds counters and phase times, e.g. from a worker process
+
+        :param counters: Counter
+        :param phase_times: Counter
+        """
+        self.counters.update(counters)
+        self.phase_times.update(phase_times)
+
+
+# context manager used for disabled phases and profiling
+_no_phase = nullcontext()
@@ -1,23 +1,37 @@
-"""Contains a simple implementation of a traceable list."""
+"""Contains a variable that ignores all values and a variable that passes values to another thread."""
 
-class ListVar(object):
+class QuietVar(object):
     """
-    A traceable list. Has getter and setter methods and can register a callback method
-    that gets called whenever a new value is set.
+    Can be passed to the search algorithms as log_var and window when nothing should be displayed.
+    Ignores all values instead of printing them.
     """
 
-    def __init__(self, length):
-        self.data = [0] * length
-        self.trace_callback = None
+    def set(self, value):
+        pass
+
+    def update(self):
+        pass
 
-    def get(self):
-        return self.data.copy()
+
+class QueueVar(object):
+    """
+    Can be passed to the search algorithms as log_var and window when the search runs in a background thread.
+    Puts every value as a list on a queue instead of touching the GUI. Is also the cancellation token of the search
+    (see Abstract_Search.set_budget), which returns its best state so far once cancel is called.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.cancelled = False
 
     def set(self, value):
-        self.data = value.copy()
+        self.queue.put(("value", list(value) if isinstance(value, (list, tuple)) else [value]))
+
+    def update(self):
+        pass
 
-        if self.trace_callback is not None:
-            self.trace_callback()
+    def cancel(self):
+        self.cancelled = True
 
-    def trace(self, callback):
-        self.trace_callback = callback
+    def is_set(self):
+        return self.cancelled
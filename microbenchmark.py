@@ -0,0 +1,274 @@
+"""Contains micro-benchmarks of the hot primitives and single search steps, with baselines and regression checks."""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from search import Abstract_Search, Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, \
+    Simulated_Annealing, Vectorized_Hillclimbing
+from searchutils import value_function, neighbors_func, neighbor_values, coverage_counts
+from warehouse import read_problem
+from listvar import QuietVar
+
+
+# instances of data/create_test_data.py that can be benchmarked, "1m" is the very large one
+sizes = ["100_items", "1k", "10k", "100k", "1m"]
+default_sizes = ["100_items", "1k", "10k", "100k"]
+
+
+def test_data_module():
+    """
+    :return: the module data/create_test_data.py, data is not a package, so it is loaded from its file
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "create_test_data.py")
+    spec = importlib.util.spec_from_file_location("create_test_data", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def instance_files(size, directory, seed = 0):
+    """
+    Creates the warehouse and order file of a preset instance, existing files are reused
+
+    :param size: name of the preset, see create_test_data.presets
+    :param directory: directory of the files
+    :param seed: random seed of the instance
+    :return: paths of the warehouse file and the order file
+    """
+    warehouse_path = os.path.join(directory, f"problem_{size}.txt")
+    order_path = os.path.join(directory, f"order_{size}.txt")
+
+    if not (os.path.exists(warehouse_path) and os.path.exists(order_path)):
+        os.makedirs(directory, exist_ok = True)
+        create_test_data = test_data_module()
+        create_test_data.create_files(size, *create_test_data.presets[size], seed = seed, directory = directory)
+
+    return warehouse_path, order_path
+
+
+def measure(function, setup = None, warmup = 2, repetitions = 10, max_seconds = 2.0):
+    """
+    Times a function, after some untimed warmup calls
+
+    :param function: function to time, called with the arguments returned by setup
+    :param setup: untimed function called before every call, returns the arguments of function
+    :param warmup: number of untimed calls
+    :param repetitions: number of timed calls
+    :param max_seconds: stop repeating once the timed calls took this long, at least 3 calls are timed
+    :return: dict with the minimal, median and mean time in seconds and the number of timed calls
+    """
+    for _ in range(warmup):
+        function(*(setup() if setup is not None else ()))
+
+    times = []
+    while len(times) < repetitions and (len(times) < 3 or sum(times) < max_seconds):
+        args = setup() if setup is not None else ()
+        t = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - t)
+
+    return {"min": min(times), "median": float(np.median(times)), "mean": float(np.mean(times)), "calls": len(times)}
+
+
+def primitives(warehouse_path, order_path, seed = 0):
+    """
+    Creates the benchmarked functions of one instance. Every search step starts from a new random state.
+
+    :param warehouse_path: path of the warehouse file
+    :param order_path: path of the order file
+    :param seed: random seed of the states
+    :return: list of (name, function, setup), see measure
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    problem = read_problem(warehouse_path, order_path)
+    quiet = QuietVar()
+
+    def search(cls):
+        return cls.from_problem(*problem, quiet, quiet)
+
+    alg = search(Abstract_Search)
+    items, order, psus, psu_nrs = problem
+
+    def random_state():
+        return (alg.random_state(),)
+
+    def solution_state():
+        return (np.ones(len(psus), dtype = bool),)
+
+    benchmarks = [
+        ("parse (read_problem)", lambda: read_problem(warehouse_path, order_path), None),
+        ("value_function", lambda state: value_function(state, order, psus), random_state),
+        ("neighbors_func", neighbors_func, random_state),
+        ("neighbor_values", lambda state: neighbor_values(state, psus), random_state),
+        ("print_solution", alg.print_solution, solution_state),
+    ]
+
+    # one step of every algorithm: evaluate (part of) the neighborhood and move
+    hill_climbing = search(Hill_Climbing)
+
+    def hill_climbing_setup():
+        evaluator = hill_climbing.evaluator(hill_climbing.random_state())
+        return evaluator, hill_climbing.neighbor_values(evaluator)
+
+    def hill_climbing_step(evaluator, value_neighbors):
+        evaluator.flip(np.argmax(value_neighbors))
+        hill_climbing.neighbor_values(evaluator)
+
+    first_choice = search(First_Choice_Hill_Climbing)
+
+    def first_choice_setup():
+        evaluator = first_choice.evaluator(first_choice.random_state())
+        return evaluator, evaluator.value()
+
+    def first_choice_step(evaluator, value):
+        index = first_choice.first_improvement(evaluator, value)
+        if index is not None:
+            evaluator.flip(index)
+
+    beam_search = search(Local_Beam_Search)
+
+    def beam_search_setup(k = 4):
+        k_states = np.array([beam_search.random_state() for _ in range(k)])
+        values = np.array([beam_search.value_function(state) for state in k_states])
+        return k_states, values, beam_search.beam_neighbor_values(k_states), k
+
+    def beam_search_step(k_states, values, value_neighbors, k):
+        k_states, values = beam_search.best_distinct_states(k_states, values, value_neighbors, k)
+        beam_search.beam_neighbor_values(k_states)
+
+    annealing = search(Simulated_Annealing)
+
+    def annealing_setup():
+        return (annealing.evaluator(annealing.random_state()),)
+
+    def annealing_step(evaluator):
+        index = random.randrange(len(annealing.psus))
+        if evaluator.flip_delta(index) > 0 or random.random() < 0.5:
+            evaluator.flip(index)
+        evaluator.value()
+
+    vectorized = search(Vectorized_Hillclimbing)
+
+    def vectorized_setup(k = 100):
+        states = np.array([vectorized.random_state() for _ in range(k)])
+        return states, coverage_counts(states, vectorized.psus)
+
+    benchmarks += [
+        ("step Hillclimbing", hill_climbing_step, hill_climbing_setup),
+        ("step First Choice Hillclimbing", first_choice_step, first_choice_setup),
+        ("step Local Beam Search (k=4)", beam_search_step, beam_search_setup),
+        ("step Simulated Annealing", annealing_step, annealing_setup),
+        ("step Vectorized Hillclimbing (k=100)", vectorized.best_neighbors, vectorized_setup),
+    ]
+
+    return benchmarks
+
+
+def run(sizes = default_sizes, directory = "microbenchmark_data", warmup = 2, repetitions = 10, max_seconds = 2.0,
+        seed = 0):
+    """
+    Runs all micro-benchmarks on the instances of the given sizes
+
+    :param sizes: names of the instances, see sizes
+    :param directory: directory of the instance files
+    :param warmup: number of untimed calls per benchmark
+    :param repetitions: number of timed calls per benchmark
+    :param max_seconds: time per benchmark after which no more calls are timed
+    :param seed: random seed of the instances and states
+    :return: generator of (size, name, measurement), see measure
+    """
+    for size in sizes:
+        warehouse_path, order_path = instance_files(size, directory, seed)
+
+        for name, function, setup in primitives(warehouse_path, order_path, seed):
+            yield size, name, measure(function, setup, warmup, repetitions, max_seconds)
+
+
+def compare(results, baseline, threshold = 25.0, noise_floor = 1e-5):
+    """
+    Compares results with a baseline by the minimal times, which are the least noisy
+
+    :param results: dict of measurements by "size/name"
+    :param baseline: dict of measurements by "size/name", e.g. a saved run
+    :param threshold: allowed slowdown in percent
+    :param noise_floor: slowdowns of fewer seconds are never regressions, timer noise of the fastest primitives
+    :return: list of (key, baseline seconds, seconds, change in percent) of all regressions
+    """
+    regressions = []
+
+    for key, measurement in results.items():
+        if key not in baseline:
+            continue
+
+        before, after = baseline[key]["min"], measurement["min"]
+        change = 100 * (after - before) / before if before > 0 else 0.0
+        if change > threshold and after - before > noise_floor:
+            regressions.append((key, before, after, change))
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Times the hot primitives and one step of every search algorithm "
+                                                   "on generated instances. Fails if a primitive got slower than "
+                                                   "the baseline by more than the threshold.")
+    parser.add_argument("--sizes", nargs = "*", default = default_sizes, choices = sizes,
+                        help = "generated instances to include")
+    parser.add_argument("--data", default = "microbenchmark_data",
+                        help = "directory of the generated instances, existing instances are reused")
+    parser.add_argument("--warmup", type = int, default = 2, help = "number of untimed calls per benchmark")
+    parser.add_argument("--repetitions", type = int, default = 10, help = "number of timed calls per benchmark")
+    parser.add_argument("--max-seconds", type = float, default = 2.0,
+                        help = "time per benchmark after which no more calls are timed")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--baseline", default = None, help = "JSON file of a saved run to compare with")
+    parser.add_argument("--threshold", type = float, default = 25.0, help = "allowed slowdown in percent")
+    parser.add_argument("--noise-floor", type = float, default = 0.01,
+                        help = "slowdowns of fewer milliseconds are never regressions")
+    parser.add_argument("--save", default = None, help = "save the results as JSON file, e.g. as a new baseline")
+    arguments = parser.parse_args()
+
+    baseline = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    for size, name, measurement in run(arguments.sizes, arguments.data, arguments.warmup, arguments.repetitions,
+                                       arguments.max_seconds, arguments.seed):
+        key = f"{size}/{name}"
+        results[key] = measurement
+
+        line = f"{size:<10} {name:<38} min {measurement['min'] * 1000:>10.3f}ms " \
+               f"median {measurement['median'] * 1000:>10.3f}ms"
+        if baseline is not None and key in baseline:
+            line += f" ({100 * (measurement['min'] / baseline[key]['min'] - 1):+.1f}%)"
+        print(line)
+
+    if arguments.save is not None:
+        with open(arguments.save, "w") as f:
+            json.dump({"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                       "seed": arguments.seed, "results": results}, f, indent = 2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, arguments.threshold, arguments.noise_floor / 1000)
+
+        print()
+        if regressions:
+            print(f"{len(regressions)} regressions of more than {arguments.threshold}%:")
+            for key, before, after, change in regressions:
+                print(f"  {key}: {before * 1000:.3f}ms -> {after * 1000:.3f}ms ({change:+.1f}%)")
+            sys.exit(1)
+
+        print(f"No regressions of more than {arguments.threshold}%.")
@@ -1,94 +1,248 @@
 """Contains parallel hillclimbing. Needs to be its own file for reasons of multiprocessing."""
 
+import time
+import weakref
+
 import numpy as np
-from multiprocessing import Process, Manager
+from multiprocessing import Pool, RawValue, TimeoutError, shared_memory
 
 from search import Abstract_Search
-from searchutils import value_function, neighbors_func
+from searchutils import Delta_Evaluator
+from instrumentation import Instrumentation
+from valuecache import Shared_Value_Cache
 
 class Parallel_Hillclimbing(Abstract_Search):
     """
-    Perform k independent hillclimb searches started from randomly generated initial states
+    Perform k independent hillclimb searches started from the start states of the start strategy
+    The searches run in a pool of worker processes that is kept alive between searches and reads the psus from
+    shared memory. Call close to shut the pool down.
+    Once a search reaches the target value (see set_target_value) all other searches are stopped. The workers also
+    stop at the deadline and when their share of the evaluation budget is used up, a cancelled search stops them
+    within poll_interval seconds (see set_budget).
+    A Shared_Value_Cache (see set_value_cache) is also used by the workers for the values of their start and end
+    states, other caches only by this process.
     """
-    def search(self, k):
-        # Process manager for value extraction in multiprocessing
-        manager = Manager()
+    pool = None
 
-        # value to check if all searches terminated
-        terminated = False
-        # list to extract if a single search terminated
-        terminations = [False for i in range(k)]
+    # seconds between checks of the cancellation token while waiting for the workers
+    poll_interval = 0.1
 
-        # save states
-        states = [0 for i in range(k)]
-        values = [0 for i in range(k)]
-        neighborss = [0 for i in range(k)]
-        value_neighbors = [0 for i in range(k)]
-
-        # initialize k neighbors from a start state
-
-        for i in range(k):
-            # we need to create a random initialization for every start-state first
-            start_state = np.random.choice([True, False], len(self.psus), p=[np.count_nonzero(self.order)/ len(self.psus), 1 - (np.count_nonzero(self.order) / len(self.psus))])
-            neighborss[i] = self.neighbors(start_state)
-
-        while not terminated:
-            # dict for value extraction
-            return_dict = manager.dict()
-
-            # start k jobs
-            jobs = []
-            for i in range(k):
-                if not terminations[i]:
-                    p = Process(target=_search_step, args=(neighborss[i], i, return_dict, self.order, self.items, self.psus))
-                    jobs.append(p)
-                    p.start()
-
-            # run them in parallel and wait for all to end their iteration
-            for p in jobs:
-                p.join()
-
-            # checks if the termination condition is fullfilled and extracts states
-            terminated = True
-            for i in range(k):
-                if not terminations[i]:
-                    states[i] = return_dict[i][0]
-
-                    terminations[i] = self.termination(return_dict[i][1], return_dict[i][3])
-                    terminated = terminations[i] and terminated
-                    neighborss[i] = return_dict[i][2]
-                    value_neighbors[i] = return_dict[i][3]
-                    values[i] = return_dict[i][1]
-
-            # Update graph
-            if self.log_var == None:
-                print('value:', values, 'done:', terminations)
-            else:
-                self.log_var.set(values)
-                self.window.update()
+    def search(self, k):
+        self.reset_search()
+        pool = self.get_pool()
+        self.stop.value = False
+
+        # initialize k start states
+        states = list(self.start_states(k))
+        if not self.affordable(k):
+            return states[0]
+        # the value of searches that are still running is the value of their start state
+        values = [self.value_function(state) for state in states]
+        terminations = [False for i in range(k)]
+        # whether a climb stopped because its share of the evaluation budget was used up
+        exhausted = False
+
+        # every worker climbs to a local maximum and only sends back the packed end state and its value
+        # the workers count and time their climbs themselves, the counts are merged into this search's instrumentation
+        # the remaining evaluation budget is shared equally by the climbs
+        max_evaluations = None
+        if self.max_evaluations is not None:
+            max_evaluations = max(self.max_evaluations - self.counters["evaluations"], 0) // k
+
+        jobs = [(i, state, self.instrumentation.timed, self.target_value, self.deadline, max_evaluations)
+                for i, state in enumerate(states)]
+        climbs = pool.imap_unordered(_climb, jobs)
+
+        for iteration in range(1, k + 1):
+            while True:
+                try:
+                    i, packed_state, value, counters, phase_times, climb_exhausted = climbs.next(self.poll_interval)
+                    break
+                except TimeoutError:
+                    # the workers stop at their next iteration and return their current states
+                    if self.stopped():
+                        self.stop.value = True
+
+            states[i] = np.unpackbits(packed_state, count=len(self.psus)).astype(bool)
+            self.instrumentation.merge(counters, phase_times)
+            values[i] = value
+            terminations[i] = True
+            exhausted = exhausted or climb_exhausted
+            self.offer(states[i], value)
+
+            # the other workers stop at their next iteration and return their current states
+            if self.reached_target(value) or self.stopped():
+                self.stop.value = True
+
+            # Update graph, one iteration per finished climb
+            self.report(iteration, values)
+
+        # only set now, a climb that used up its share doesn't stop the others
+        self.exhausted = self.exhausted or exhausted
 
         return states[values.index(max(values))]
 
+    def set_value_cache(self, value_cache):
+        """
+        Puts a cache in front of value_function, a Shared_Value_Cache is also given to the workers. The pool is
+        started again if it was started with another cache.
+
+        :param value_cache: valuecache.LRU_Value_Cache, valuecache.Shared_Value_Cache or None
+        """
+        if self.pool is not None and self.worker_cache() is not value_cache:
+            self.close()
+
+        super().set_value_cache(value_cache)
+
+    def worker_cache(self):
+        """
+        :return: the value cache of the workers, None unless the value cache is shared
+        """
+        return self.value_cache if isinstance(self.value_cache, Shared_Value_Cache) else None
+
+    def get_pool(self):
+        """
+        Returns the worker pool, creates it and copies the psus to shared memory on first use
+        :return: multiprocessing.Pool
+        """
+        if self.pool is None:
+            arrays = {"psus": self.psus}
+
+            self.shared = {}
+            descriptions = {}
+
+            for name, array in arrays.items():
+                shared = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, array.dtype, buffer=shared.buf)[...] = array
+                self.shared[name] = shared
+                descriptions[name] = shared.name, array.shape, array.dtype.str
+
+            # set to let all workers stop their current climbs
+            self.stop = RawValue('b', False)
+
+            self.pool = Pool(initializer=_attach, initargs=(descriptions, self.stop, self.worker_cache()))
+
+            # shut the pool down and release the shared memory when the search object is garbage collected
+            self._finalizer = weakref.finalize(self, _release, self.pool, list(self.shared.values()))
+
+        return self.pool
+
+    def close(self):
+        """
+        Shuts the worker pool down and releases the shared memory
+        """
+        if self.pool is not None:
+            self._finalizer()
+            self.pool = None
+
+
+def _release(pool, shared):
+    pool.terminate()
+    pool.join()
+
+    for shared_block in shared:
+        shared_block.close()
+        shared_block.unlink()
+
 
-def _search_step(neighbors, procnum, return_dict, order, items, psus):
+# problem data of a worker process, set by _attach
+_shared = []
+_evaluator = None
+_stop = None
+_value_cache = None
+
+def _attach(descriptions, stop, value_cache):
+    """
+    Initializes a worker process with the psus in shared memory.
+    :param descriptions: name, shape and dtype of every shared array
+    :param stop: shared flag that is set when the climbs should stop
+    :param value_cache: Shared_Value_Cache of the values of start and end states, or None
+    """
+    global _evaluator, _stop, _value_cache
+
+    _stop = stop
+    _value_cache = value_cache
+
+    arrays = {}
+    for name, (shared_name, shape, dtype) in descriptions.items():
+        shared = shared_memory.SharedMemory(name=shared_name)
+        # keep a reference, the arrays are only valid as long as the shared memory is open
+        _shared.append(shared)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=shared.buf)
+
+    psus = arrays["psus"]
+    _evaluator = Delta_Evaluator(np.zeros(len(psus), dtype=bool), psus)
+
+
+def _climb(job):
     """
-    This is a function that does one single hillclimb step.
-    :param neighbors:
-    :param procnum: number of this parallel process
-    :param return_dict: current, value, neighbors, value_neighbors are returned via this dictionary
+    This is a function that does a whole hillclimb search in a worker process.
+    :param job: number of this search, its start state, whether to time the phases, the target value, the deadline
+                and the evaluation budget of this search
+    :return: number of this search, its packed end state, the end state's value, the counters and phase times
+             of this search, and whether it stopped because its evaluation budget was used up
     """
+    procnum, state, timed, target_value, deadline, max_evaluations = job
+
+    instrumentation = Instrumentation(timed)
+    _evaluator.counters = instrumentation.counters
+    _evaluator.reset(state)
+    value = _cached_value(instrumentation.counters)
+
+    # a neighborhood is only evaluated if all of its states fit into the evaluation budget
+    def affordable():
+        return (max_evaluations is None or
+                instrumentation.counters["evaluations"] + len(_evaluator.state) <= max_evaluations)
 
+    exhausted = not affordable()
+    value_neighbors = np.empty(0, dtype=np.intp)
+    if not exhausted:
+        with instrumentation.phase("evaluate"):
+            value_neighbors = _evaluator.neighbor_values()
 
+    # climb to a local maximum, until this or another climb reached the target value or the budget is used up
+    while (np.any(value_neighbors > value) and not _stop.value and (target_value is None or value < target_value)
+           and (deadline is None or time.time() < deadline)):
 
-    # Choose the biggest neighbour
-    max_neighbor = neighbors[np.argmax(np.apply_along_axis(lambda x: value_function(x, order, psus), 1, neighbors))]
+        instrumentation.counters["iterations"] += 1
+
+        # Choose the biggest neighbour
+        with instrumentation.phase("select"):
+            _evaluator.flip(np.argmax(value_neighbors))
+        value = _evaluator.value()
+
+        if not affordable():
+            exhausted = True
+            break
+
+        # Evaluate the new neighbours
+        instrumentation.counters["neighborhood_evaluations"] += 1
+        with instrumentation.phase("evaluate"):
+            value_neighbors = _evaluator.neighbor_values()
+
+    if _value_cache is not None:
+        _value_cache.put(_evaluator.state, value)
+
+    return (procnum, np.packbits(_evaluator.state), value, instrumentation.counters, instrumentation.phase_times,
+            exhausted)
+
+
+def _cached_value(counters):
+    """
+    Looks up the value of the evaluator's current state in the shared value cache, computes and caches it on a miss
+    :param counters: Counter of the cache hits and misses
+    :return: value of the current state
+    """
+    if _value_cache is None:
+        return _evaluator.value()
 
-    # Calculate new current and view it
-    current = max_neighbor
-    value = value_function(current, order, psus)
+    value = _value_cache.get(_evaluator.state)
+    if value is not None:
+        counters["cache_hits"] += 1
+        return value
 
-    # Create new neighbours and their values
-    neighbors = neighbors_func(current)
-    value_neighbors = np.apply_along_axis(lambda x: value_function(x, order, psus), 1, neighbors)
+    counters["cache_misses"] += 1
+    value = _evaluator.value()
+    _value_cache.put(_evaluator.state, value)
 
-    return_dict[procnum] = current, value, neighbors, value_neighbors
+    return value
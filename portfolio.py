@@ -0,0 +1,230 @@
+"""Contains the portfolio solver, which races several search algorithms on the same order in a process pool."""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from search import Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, Simulated_Annealing
+from warehouse import read_problem
+from bounds import lower_bound
+from valuecache import Shared_Value_Cache
+
+
+# label, algorithm class and search arguments of the default portfolio
+default_entries = [
+    ("Hillclimbing", Hill_Climbing, ()),
+    ("First Choice Hillclimbing", First_Choice_Hill_Climbing, ()),
+    ("Local Beam Search", Local_Beam_Search, (4,)),
+    ("Simulated Annealing with final Hillclimb", Simulated_Annealing, ()),
+]
+
+
+class Portfolio():
+    """
+    Runs several search algorithms (and random restarts of hillclimbing) at the same time in a process pool.
+    All runs share the best value found so far. The portfolio stops as soon as a run reaches a value that can't be
+    beaten or the time budget runs out, and reports the best run. At the end of the time budget every run returns
+    the best state it found, runs that take longer than grace_period seconds more are lost.
+    """
+    grace_period = 1.0
+
+    def __init__(self, warehouse, order, entries = None, restarts = 0, processes = None, time_budget = None,
+                 cache = False, value_cache_bytes = 0):
+        """
+        :param warehouse: path of the warehouse file
+        :param order: path of the order file
+        :param entries: list of (label, algorithm class, search arguments), defaults to default_entries
+        :param restarts: number of additional hillclimbing runs from other random start states
+        :param processes: number of worker processes, defaults to the number of cores
+        :param time_budget: wall-clock budget in seconds, None for no limit
+        :param cache: load the warehouse from its compiled binary cache
+        :param value_cache_bytes: size of a value cache in shared memory that all runs use, 0 for no cache
+        """
+        self.problem = read_problem(warehouse, order, cache)
+        self.entries = list(default_entries if entries is None else entries)
+        self.entries += [(f"Hillclimbing (restart {i + 1})", Hill_Climbing, ()) for i in range(restarts)]
+        self.processes = processes
+        self.time_budget = time_budget
+        self.value_cache_bytes = value_cache_bytes
+        # lower bound for the number of psus needed, computed on first use
+        self.bound = None
+
+    def best_possible_value(self):
+        """
+        :return: a value no solution can exceed, from the lower bound for the number of psus needed
+        """
+        if self.bound is None:
+            self.bound = lower_bound(self.problem[2])
+
+        return len(self.problem[2]) - self.bound
+
+    def solve(self, seed = None):
+        """
+        Runs all entries of the portfolio
+
+        :param seed: seed of the first run, the following runs use the next seeds
+        :return: dict with the winning algorithm, its state and value, and the results of all finished runs
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+
+        incumbent = multiprocessing.Value('d', -np.inf)
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        jobs = [(label, cls, args, seed + i, deadline) for i, (label, cls, args) in enumerate(self.entries)]
+
+        results = []
+        best = None
+
+        value_cache = None
+        if self.value_cache_bytes > 0:
+            value_cache = Shared_Value_Cache(len(self.problem[2]), self.value_cache_bytes)
+
+        pool = multiprocessing.Pool(self.processes, initializer = _init_worker,
+                                    initargs = (self.problem, incumbent, self.best_possible_value(), value_cache))
+        try:
+            runs = pool.imap_unordered(_run, jobs)
+
+            for _ in jobs:
+                # the runs return their incumbents at the deadline, runs that are later than the grace period are lost
+                timeout = None if deadline is None else max(deadline + self.grace_period - time.time(), 0)
+                try:
+                    label, packed_state, value, seconds, stopped, cache_stats = runs.next(timeout)
+                except multiprocessing.TimeoutError:
+                    break
+
+                results.append({"algorithm": label, "value": value, "seconds": seconds,
+                                "stopped": stopped, "cache": cache_stats})
+
+                if best is None or value > best[2]:
+                    best = label, packed_state, value
+
+                # stop early if the incumbent can't be beaten
+                if value >= self.best_possible_value():
+                    break
+        finally:
+            # runs that are still going are not needed anymore
+            pool.terminate()
+            pool.join()
+
+            if value_cache is not None:
+                value_cache.close()
+
+        solution = {"algorithm": None, "state": None, "value": None, "results": results,
+                    "incumbent": incumbent.value, "finished": len(results), "runs": len(jobs)}
+
+        if best is not None:
+            solution["algorithm"] = best[0]
+            solution["state"] = np.unpackbits(best[1], count = len(self.problem[2])).astype(bool)
+            solution["value"] = best[2]
+
+        return solution
+
+    def print_solution(self, solution):
+        """
+        Returns a string representation of a portfolio solution, see Abstract_Search.print_solution
+        """
+        output = f"Finished {solution['finished']} of {solution['runs']} runs.\n"
+
+        for result in sorted(solution["results"], key = lambda result: -result["value"]):
+            stopped = ", stopped early" if result["stopped"] else ""
+            cache = ""
+            if result["cache"] is not None:
+                lookups = result["cache"]["hits"] + result["cache"]["misses"]
+                cache = f", {result['cache']['hits']} of {lookups} values cached"
+            output += f"  {result['algorithm']}: {result['value']} ({result['seconds']:.3f}s{stopped}{cache})\n"
+
+        if solution["algorithm"] is None:
+            return output + "No run finished within the time budget.\n"
+
+        output += f"\nWinner: {solution['algorithm']}\n\n"
+
+        return output + Hill_Climbing.from_problem(*self.problem).print_solution(solution["state"])
+
+
+# problem data of a worker process, set by _init_worker
+_problem = None
+_incumbent = None
+_best_possible = None
+_value_cache = None
+
+def _init_worker(problem, incumbent, best_possible, value_cache):
+    global _problem, _incumbent, _best_possible, _value_cache
+    _problem, _incumbent, _best_possible = problem, incumbent, best_possible
+    _value_cache = value_cache
+
+
+class _Incumbent_Var():
+    """
+    Is passed to the algorithms as log_var and window, and as cancellation token. Publishes every value the algorithm
+    reports as the shared incumbent if it is better, and is set once another run reached a value that can't be
+    beaten.
+    """
+    def __init__(self):
+        self.best = -np.inf
+
+    def set(self, value):
+        value = np.max(value)
+        self.best = max(self.best, value)
+
+        if value > _incumbent.value:
+            with _incumbent.get_lock():
+                _incumbent.value = max(_incumbent.value, value)
+
+    def update(self):
+        pass
+
+    def is_set(self):
+        return _incumbent.value >= _best_possible and self.best < _incumbent.value
+
+
+def _run(job):
+    """
+    Runs one entry of the portfolio in a worker process
+    :param job: label, algorithm class, search arguments, seed and deadline
+    :return: label, packed end state, value, run time, whether the run was stopped before it finished and the stats
+             of the value cache in this run (None without cache)
+    """
+    label, cls, args, seed, deadline = job
+    np.random.seed(seed)
+    random.seed(seed)
+
+    t = time.time()
+
+    reporter = _Incumbent_Var()
+    alg = cls.from_problem(*_problem, log_var = reporter, window = reporter)
+    alg.set_value_cache(_value_cache)
+    # the run returns its best state so far at the deadline or when another run can't be beaten anymore
+    alg.set_budget(deadline = deadline, cancel = reporter)
+    cache_stats = None
+
+    state = alg.search(*args)
+    stopped = alg.stopped()
+
+    value = alg.value_function(state)
+    reporter.set(value)
+
+    if _value_cache is not None:
+        cache_stats = {"hits": alg.counters["cache_hits"], "misses": alg.counters["cache_misses"]}
+
+    return label, np.packbits(state), value, time.time() - t, stopped, cache_stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Races all local search algorithms on one order.")
+    parser.add_argument("warehouse", help = "warehouse file")
+    parser.add_argument("order", help = "order file")
+    parser.add_argument("--budget", type = float, default = None, help = "time budget in seconds")
+    parser.add_argument("--restarts", type = int, default = 4, help = "additional hillclimbing restarts")
+    parser.add_argument("--processes", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--value-cache-mb", type = float, default = 0,
+                        help = "size of the value cache shared by all runs in MB")
+    arguments = parser.parse_args()
+
+    portfolio = Portfolio(arguments.warehouse, arguments.order, restarts = arguments.restarts,
+                          processes = arguments.processes, time_budget = arguments.budget,
+                          value_cache_bytes = int(arguments.value_cache_mb * 2 ** 20))
+    print(portfolio.print_solution(portfolio.solve(arguments.seed)))
@@ -0,0 +1,137 @@
+"""Contains the reduction of a problem before the search: forced psus, dominated psus and identical order items."""
+
+import argparse
+
+import numpy as np
+
+from warehouse import read_problem
+
+
+class Reduction():
+    """
+    Shrinks a problem without changing its best solutions, until none of the rules applies anymore:
+     - a psu that is the only one containing an ordered item is part of every solution. It is fixed and the items it
+       contains are removed from the order.
+     - a psu whose ordered items are all contained in another psu is removed, one psu can always replace it.
+     - ordered items contained in exactly the same psus are merged into one.
+    The search runs on the reduced problem, expand maps its states back to the original problem.
+    """
+    def __init__(self, items, order, psus, psu_nrs):
+        """
+        :param items: list of all items
+        :param order: binary representation of the order
+        :param psus: 2D array containing the relevant psus
+        :param psu_nrs: psu-nrs of the relevant psus
+        """
+        self.original = items, order, psus, psu_nrs
+
+        # positions of the remaining psus and order items (columns), and the fixed psus
+        rows = np.arange(len(psus))
+        columns = np.arange(psus.shape[1])
+        self.forced = np.zeros(len(psus), dtype=bool)
+        self.n_dominated = 0
+        self.n_identical = 0
+
+        while True:
+            reduced = psus[np.ix_(rows, columns)]
+
+            # items that only one psu contains
+            sole = np.count_nonzero(reduced, axis=0) == 1
+            if np.any(sole):
+                forcing = np.any(reduced[:, sole], axis=1)
+                self.forced[rows[forcing]] = True
+                columns = columns[~np.any(reduced[forcing], axis=0)]
+                rows = rows[~forcing]
+                continue
+
+            dominated = dominated_rows(reduced)
+            if np.any(dominated):
+                self.n_dominated += np.count_nonzero(dominated)
+                rows = rows[~dominated]
+                continue
+
+            # the first of every group of identical columns is kept
+            _, first = np.unique(np.packbits(reduced.T, axis=1), axis=0, return_index=True)
+            if len(first) < len(columns):
+                self.n_identical += len(columns) - len(first)
+                columns = columns[np.sort(first)]
+                continue
+
+            break
+
+        # without ordered items left no remaining psu is needed
+        if len(columns) == 0:
+            self.n_dominated += len(rows)
+            rows = rows[:0]
+
+        if len(rows) == 0:
+            # the forced psus cover the whole order, the search still needs something to decide
+            rows = np.flatnonzero(self.forced)[:1]
+            columns = np.flatnonzero(psus[rows[0]])[:1]
+            self.forced[rows] = False
+
+        self.rows, self.columns = rows, columns
+
+        reduced_order = np.zeros_like(order)
+        reduced_order[np.flatnonzero(order)[columns]] = True
+
+        self.problem = items, reduced_order, psus[np.ix_(rows, columns)], psu_nrs[rows]
+
+    def expand(self, state):
+        """
+        Maps a state of the reduced problem to the original problem, the fixed psus are used
+
+        :param state: binary array describing used PSUs of the reduced problem
+        :return: binary array describing used PSUs of the original problem
+        """
+        original_state = self.forced.copy()
+        original_state[self.rows] = state
+
+        return original_state
+
+    def summary(self):
+        """
+        :return: string describing how much the problem was reduced
+        """
+        n_psus, n_items = self.original[2].shape
+        n_forced = np.count_nonzero(self.forced)
+
+        return (f"Reduced the problem from {n_psus} to {len(self.rows)} PSUs ({n_forced} forced, "
+                f"{self.n_dominated} dominated) and from {n_items} to {len(self.columns)} ordered items "
+                f"({self.n_identical} merged, {n_items - len(self.columns) - self.n_identical} covered by forced PSUs)")
+
+
+def dominated_rows(psus, block_size=1024):
+    """
+    Finds the psus whose items are all contained in another psu. Of several identical psus all but the first
+    are dominated.
+
+    :param psus: 2D array containing the psus
+    :param block_size: number of psus compared with all others at once
+    :return: binary array, True for every dominated psu
+    """
+    sizes = np.count_nonzero(psus, axis=1)
+    psus_float = psus.astype(np.float32)
+    dominated = np.zeros(len(psus), dtype=bool)
+
+    for start in range(0, len(psus), block_size):
+        block = slice(start, start + block_size)
+        # number of common items of every psu in the block with every psu
+        common = np.rint(psus_float[block] @ psus_float.T)
+
+        # psu a is contained in psu b if all of its items are common items, the larger (or earlier) psu is kept
+        contained = common == sizes[block, np.newaxis]
+        larger = (sizes > sizes[block, np.newaxis]) | ((sizes == sizes[block, np.newaxis]) &
+                                                       (np.arange(len(psus)) < np.arange(len(psus))[block, np.newaxis]))
+        dominated[block] = np.any(contained & larger, axis=1)
+
+    return dominated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Shows how much a problem is reduced before the search.")
+    parser.add_argument("warehouse", help = "warehouse file")
+    parser.add_argument("order", help = "order file")
+    arguments = parser.parse_args()
+
+    print(Reduction(*read_problem(arguments.warehouse, arguments.order)).summary())
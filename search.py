@@ -1,115 +1,294 @@
 """ Contains all local search algorithms except parallel hillclimbing, as well as an abstract class for search algorithms. """
 
 import numpy as np
-from multiprocessing import Process, Manager
-import time
 
-from itertools import count, compress
+import queue
 import random
-from math import exp
+import threading
+from math import exp, log
+import time
 
-from searchutils import value_function, neighbors_func
+from warehouse import read_problem
+from reduction import Reduction
+from bounds import lower_bound, greedy_cover
+from instrumentation import Instrumentation
+from searchutils import value_function, neighbors_func, neighbor_values, coverage_counts, state_values, \
+    Delta_Evaluator
 
 class Abstract_Search():
     """
     This is an abstract search class that all other search-algorithms can inherit.
     """
-    def __init__(self, warehouse, order, log_var = None, window = None):
+    def __init__(self, warehouse, order, log_var = None, window = None, cache = False,
+                 instrumentation = None, reduce = False):
         self.directories = [warehouse, order]
-        self.items = self.get_items(warehouse)
-        self.order = self.open_order(order, self.items)
-        self.psus, self.psu_nrs = self.get_psus(warehouse, self.items, self.order)
-        # init start_state
-        self.start_state = np.random.choice([True, False], len(self.psus), p=[np.count_nonzero(self.order) / len(self.items),
-                                            1 - (np.count_nonzero(self.order) / len(self.items))])
+        self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        # with cache the warehouse is loaded from its compiled binary version, see warehouse.Warehouse
+        with self.instrumentation.phase("parse"):
+            problem = read_problem(warehouse, order, cache)
+        self.set_problem(*problem, reduce = reduce)
         self.log_var = log_var
         self.window = window
 
 
-    def start(self):
+    @classmethod
+    def from_problem(cls, items, order, psus, psu_nrs, log_var = None, window = None, instrumentation = None,
+                     reduce = False):
         """
-        Initializes the start states of a search
-        :return: current-state, value, neighbors, value_neighbors
+        Creates a search for an already loaded problem instead of reading it from files
+
+        :param items: list of all items
+        :param order: binary representation of the order
+        :param psus: 2D array containing the relevant psus
+        :param psu_nrs: psu-nrs of the relevant psus
+        :param reduce: search the problem reduced by reduction.Reduction
+        :return: search object
         """
-        current = self.start_state
-        value = self.value_function(current)
-        neighbors = self.neighbors(current)
-        value_neighbors = np.apply_along_axis(self.value_function, 1, neighbors)
+        search = cls.__new__(cls)
+        search.directories = None
+        search.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        search.set_problem(items, order, psus, psu_nrs, reduce = reduce)
+        search.log_var = log_var
+        search.window = window
 
-        return current, value, neighbors, value_neighbors
+        return search
 
 
-    def get_items(self, path):
+    @classmethod
+    def from_search(cls, other):
         """
-        Retrieves a list of all items from the given file
+        Creates a search that reuses the problem, the backend and the output of another search object
 
-        :param path: file path
-        :return: list of items
+        :param other: search object
+        :return: search object with a new start state
         """
-        with open(path) as f:
-            data = f.read()
+        search = cls.from_problem(other.items, other.order, other.psus, other.psu_nrs, other.log_var, other.window,
+                                  instrumentation = other.instrumentation)
+        search.directories = other.directories
+        search.reduction = other.reduction
+        search.target_value = other.target_value
+        search.value_cache = other.value_cache
+        search.deadline, search.max_evaluations, search.cancel = other.deadline, other.max_evaluations, other.cancel
+        search.start_strategy = other.start_strategy
 
-        lines = data.split("\n")
-        items = lines[0].split(" ")
+        return search
 
-        return items
+
+    def set_problem(self, items, order, psus, psu_nrs, reduce = False):
+        """
+        Sets the problem to search and initializes the start state
+        """
+        # the search runs on the reduced problem, states are mapped back with original_state
+        self.reduction = None
+        if reduce:
+            with self.instrumentation.phase("reduce"):
+                self.reduction = Reduction(items, order, psus, psu_nrs)
+            items, order, psus, psu_nrs = self.reduction.problem
+
+        self.items, self.order, self.psus, self.psu_nrs = items, order, psus, psu_nrs
+        # number of evaluated states, search iterations etc., see instrumentation.Instrumentation
+        self.counters = self.instrumentation.counters
+        # the search stops as soon as it reaches this value, see set_target_value
+        self.target_value = None
+        # cache of the values computed by value_function, see set_value_cache
+        self.value_cache = None
+        # wall-clock deadline, evaluation budget and cancellation token, see set_budget
+        self.deadline = self.max_evaluations = self.cancel = None
+        # best state found by the current search and its value, see offer and reset_search
+        self.incumbent = self.incumbent_value = None
+        # set when the next step of the search doesn't fit into the evaluation budget anymore, see affordable
+        self.exhausted = False
+        # queue that receives every new incumbent, see improvements
+        self.incumbent_queue = None
+        # creates the start states, see set_start_strategy
+        self.start_strategy = Random_Start()
+        # init start_state
+        self.start_state = self.random_state()
 
 
-    def get_psus(self, path, items, order):
+    def set_target_value(self, target_value = None, node_limit = 0):
         """
-        Retrieves a list of the PSUs that contain items of the current order
-        A PSU is described by a binary array that contains the order items
+        Lets the search stop as soon as its current state reaches a value, by default the best value the lower bound
+        of bounds.lower_bound allows. Then the search stops with a proven optimal state.
 
-        :param path: file path
-        :param items: list of all items
-        :return: 2D array containing the psus
+        :param target_value: value to stop at, None for the best value allowed by the lower bound
+        :param node_limit: nodes of the branch and bound used for the lower bound, see bounds.lower_bound
+        """
+        if target_value is None:
+            with self.instrumentation.phase("bound"):
+                target_value = len(self.psus) - lower_bound(self.psus, node_limit)
+
+        self.target_value = target_value
+
+
+    def set_start_strategy(self, start_strategy):
+        """
+        Sets how the start states of the search are created and creates a new start state
+
+        :param start_strategy: Random_Start, Greedy_Start, GRASP_Start or any function of the psus and the number of
+                               states that returns one state per row
+        """
+        self.start_strategy = start_strategy
+        self.start_state = self.random_state()
+
+
+    def set_value_cache(self, value_cache):
         """
-        with open(path) as f:
-            data = f.read()
+        Puts a cache in front of value_function. The incremental evaluation of neighbors is cheaper than a cache
+        lookup and doesn't use it.
 
-        lines = data.split("\n")
+        :param value_cache: valuecache.LRU_Value_Cache, valuecache.Shared_Value_Cache to share it between processes,
+                            or None
+        """
+        self.value_cache = value_cache
 
-        # collect the important psus for our search and remember their psu-nr
-        psus = []
-        psu_nrs = []
 
-        order_index = np.nonzero(order)
+    def set_budget(self, time_limit = None, deadline = None, max_evaluations = None, cancel = None):
+        """
+        Limits the search. Every algorithm checks the limits in its loop and returns the best state found so far
+        (the incumbent) as soon as one of them is reached.
 
-        for index, line in enumerate(lines[2:]):
-            psu_temp = np.zeros(len(items), dtype=bool)
-            psu_items = line.split(" ")
+        :param time_limit: seconds from now
+        :param deadline: wall-clock time (time.time()) to stop at, the earlier of time_limit and deadline is used
+        :param max_evaluations: number of evaluated states (counters["evaluations"]) to stop at
+        :param cancel: cancellation token, e.g. a threading.Event, the search stops once its is_set() returns True
+        """
+        if time_limit is not None:
+            deadline = time.time() + time_limit if deadline is None else min(deadline, time.time() + time_limit)
 
-            for item in psu_items:
-                item_index = items.index(item)
-                psu_temp[item_index] = 1
+        self.deadline, self.max_evaluations, self.cancel = deadline, max_evaluations, cancel
+        self.exhausted = False
 
-            if np.any(psu_temp[order_index]):
-                psus.append(psu_temp[order_index])
-                psu_nrs.append(index)
 
-        psus = np.asarray(psus)
-        psu_nrs = np.asarray(psu_nrs)
-        return psus, psu_nrs
+    def stopped(self):
+        """
+        :return: True if the deadline passed, the evaluation budget is used up or the search was cancelled
+        """
+        return (self.exhausted or (self.cancel is not None and self.cancel.is_set()) or
+                (self.deadline is not None and time.time() >= self.deadline) or
+                (self.max_evaluations is not None and self.counters["evaluations"] >= self.max_evaluations))
+
 
+    def affordable(self, n_evaluations):
+        """
+        Checks if a step fits into the evaluation budget, a search that can't afford its next step counts as stopped
 
-    def open_order(self, path, items):
+        :param n_evaluations: number of states the step evaluates
+        :return: True if there is no evaluation budget or the step fits into it
+        """
+        if self.max_evaluations is None or self.counters["evaluations"] + n_evaluations <= self.max_evaluations:
+            return True
+
+        self.exhausted = True
+        return False
+
+
+    def reset_search(self):
+        """
+        Forgets the incumbent of the previous search, called at the beginning of every search
+        """
+        self.incumbent = self.incumbent_value = None
+        self.exhausted = False
+
+
+    def offer(self, state, value):
+        """
+        Keeps a copy of a state if it is better than the incumbent, the best state found by the current search
+
+        :param state: binary array describing used PSUs
+        :param value: value of the state
+        """
+        if self.incumbent_value is None or value > self.incumbent_value:
+            self.incumbent, self.incumbent_value = state.copy(), value
+
+            if self.incumbent_queue is not None:
+                self.incumbent_queue.put(("incumbent", (self.incumbent, value)))
+
+
+    def improvements(self, *args):
+        """
+        Runs the search in a background thread and yields every new incumbent as soon as it is found. Closing the
+        generator early cancels the search.
+
+        :param args: arguments of the search method
+        :return: generator of (state, value), the last state is the result of the search
+        """
+        found = queue.Queue()
+        abandoned = threading.Event()
+        user_cancel = self.cancel
+
+        def run():
+            try:
+                found.put(("done", self.search(*args)))
+            except Exception as err:
+                found.put(("error", err))
+
+        self.incumbent_queue = found
+        self.cancel = _Any_Set(user_cancel, abandoned)
+        thread = threading.Thread(target = run, daemon = True)
+        thread.start()
+
+        try:
+            while True:
+                kind, content = found.get()
+                if kind == "error":
+                    raise content
+                if kind == "done":
+                    # the result is the incumbent, unless the search returns a state that was never offered
+                    if self.incumbent is None or not np.array_equal(content, self.incumbent):
+                        yield content, self.value_function(content)
+                    return
+                yield content
+        finally:
+            abandoned.set()
+            thread.join()
+            self.incumbent_queue = None
+            self.cancel = user_cancel
+
+
+    def reached_target(self, value):
+        """
+        :param value: value of the current state
+        :return: True if the search can stop because the value reached the target value
+        """
+        return self.target_value is not None and value >= self.target_value
+
+
+    def random_state(self):
+        """
+        Creates a start state with the start strategy
+        :return: binary array describing used PSUs
+        """
+        return self.start_states(1)[0]
+
+
+    def start_states(self, k):
+        """
+        Creates k start states with the start strategy, e.g. for the beams of local beam search
+        :param k: number of states
+        :return: 2D array with one binary state per row
         """
-        Retrieves the order from the given file
+        with self.instrumentation.phase("start"):
+            return np.asarray(self.start_strategy(self.psus, k), dtype=bool)
 
-        :param path: file path
-        :param items: list of all get_items
-        :return: list of all ordered items
+
+    def start(self):
+        """
+        Initializes the start states of a search
+        :return: evaluator of the current state, value, value_neighbors
         """
-        with open(path) as f:
-            order_raw = f.read()
+        evaluator = self.evaluator(self.start_state)
+        value = evaluator.value()
+        value_neighbors = self.neighbor_values(evaluator)
 
-        order_raw = order_raw.split(' ')
-        order = np.zeros(len(items), dtype=bool)
+        return evaluator, value, value_neighbors
 
-        for item_in_order in order_raw:
-            order[items.index(item_in_order)] = True
 
-        return order
+    def close(self):
+        """
+        Releases resources held by the search, e.g. worker processes
+        """
+        pass
 
 
     def print_solution(self, final_state):
@@ -117,28 +296,61 @@ class Abstract_Search():
         Returns a string representation of the final state with Information of the order, the value of the end
         state and the PSUs needed including their used items
         """
+        return format_solution(self.solution_dict(final_state))
+
+
+    def solution_dict(self, final_state):
+        """
+        Returns the information of print_solution as a dict of plain python types, e.g. for JSON output
+
+        :param final_state: binary array describing used PSUs of the searched problem
+        :return: dict with the ordered items, the number of PSUs needed, the used PSUs (their psu-nr counted from 1
+                 and the ordered items they contain), the value of the end state and the reduction summary
+        """
+        items, order, psus, psu_nrs = self.items, self.order, self.psus, self.psu_nrs
+        value = self.original_value(final_state)
+        reduction = None
+
+        # the solution of the original problem
+        if self.reduction is not None:
+            reduction = self.reduction.summary()
+            items, order, psus, psu_nrs = self.reduction.original
+            final_state = self.reduction.expand(final_state)
+
+        order_raw = np.compress(order, items)
+        used_psus = [{"psu_nr": int(psu_nr) + 1, "items": np.compress(psu, order_raw).tolist()}
+                     for psu_nr, psu in zip(np.compress(final_state, psu_nrs), np.compress(final_state, psus, axis=0))]
+
+        return {"order": order_raw.tolist(), "n_psus": len(used_psus), "psus": used_psus, "value": int(value),
+                "reduction": reduction}
 
-        output = ""
 
-        # display order
-        psus_state = np.compress(final_state, self.psus, axis=0)
-        order_raw = np.compress(self.order, self.items)
-        output += "Order: " + str(set(order_raw)) + '\n\n'
+    def original_state(self, state):
+        """
+        Maps a state of the searched problem to the original problem, which differ if the problem was reduced
 
-        #  Numbers of psus needed
-        number_of_psus = np.count_nonzero(final_state)
-        output += "Number of PSUs needed: {}\n\n".format(number_of_psus)
+        :param state: binary array describing used PSUs of the searched problem
+        :return: binary array describing used PSUs of the original problem
+        """
+        if self.reduction is None:
+            return state
 
-        # display psus used
-        for index, psu in enumerate(psus_state):
-            items_in_psu = np.compress(psu, order_raw)
-            output += f"PSU Nr.{self.psu_nrs[index] + 1}: {items_in_psu}" + '\n'
+        return self.reduction.expand(state)
 
-        # display value
-        output += f"\nValue of end state: {self.value_function(final_state)}\n"
 
-        return output
+    def original_value(self, state):
+        """
+        Evaluates a state of the searched problem in the original problem. Values of the reduced problem don't count
+        the fixed PSUs and the merged items.
 
+        :param state: binary array describing used PSUs of the searched problem
+        :return: value of the state in the original problem
+        """
+        if self.reduction is None:
+            return self.value_function(state)
+
+        _, order, psus, _ = self.reduction.original
+        return value_function(self.reduction.expand(state), order, psus)
 
 
     def value_function(self, state):
@@ -148,8 +360,23 @@ class Abstract_Search():
         :param state: binary array describing used PSUs
         :return: value of state
         """
+        self.counters["value_function_calls"] += 1
+
+        if self.value_cache is not None:
+            value = self.value_cache.get(state)
+            if value is not None:
+                self.counters["cache_hits"] += 1
+                return value
+            self.counters["cache_misses"] += 1
+
+        self.counters["evaluations"] += 1
+        with self.instrumentation.phase("evaluate"):
+            value = value_function(state, self.order, self.psus)
 
-        return value_function(state, self.order, self.psus)
+        if self.value_cache is not None:
+            self.value_cache.put(state, value)
+
+        return value
 
 
     def neighbors(self, state):
@@ -162,16 +389,164 @@ class Abstract_Search():
         :return: 2D array containing all state's neighbors
         """
 
+        self.counters["neighbor_generations"] += 1
         return neighbors_func(state)
 
+    def evaluator(self, state):
+        """
+        Creates an evaluator that keeps track of the order items covered by a state and
+        evaluates single PSU flips incrementally
+
+        :param state: binary array describing used PSUs
+        :return: Delta_Evaluator of the state
+        """
+        return Delta_Evaluator(state, self.psus, self.counters)
+
+    def neighbor_values(self, evaluator):
+        """
+        Evaluates all neighbors of the evaluator's current state without creating them
+
+        :param evaluator: Delta_Evaluator of the current state
+        :return: array with the value of every neighbor
+        """
+        # a search that is stopped sees no better neighbor
+        if self.stopped() or not self.affordable(np.size(evaluator.state)):
+            return np.empty(0, dtype=np.intp)
+
+        self.counters["neighborhood_evaluations"] += 1
+        with self.instrumentation.phase("evaluate"):
+            return evaluator.neighbor_values()
+
+    def report(self, iteration, value):
+        """
+        Shows the progress of a search after an iteration: prints it, or sets log_var and updates the window if
+        given, and calls the per-iteration callbacks of the instrumentation
+
+        :param iteration: number of the iteration
+        :param value: value (or list of values) after the iteration
+        """
+        if self.log_var is None:
+            print(iteration, value)
+        else:
+            self.log_var.set(value)
+        if self.window is not None:
+            self.window.update()
+
+        self.instrumentation.iteration(self, iteration, value)
+
     def termination(self, value, value_neighbors):
         """
-        Checks if there is a higher value in its neighborhood
+        Checks if there is a higher value in its neighborhood, if the value already reached the target value or if
+        the budget is used up
         :param value: value
         :param value_neighbors: list of values
         :return: Bool
         """
-        return not np.any(value_neighbors > value)
+        return self.reached_target(value) or self.stopped() or not np.any(value_neighbors > value)
+
+
+def format_solution(solution):
+    """
+    Returns a string representation of a solution dict (see Abstract_Search.solution_dict) with Information of the
+    order, the value of the end state and the PSUs needed including their used items
+    """
+    output = ""
+
+    if solution["reduction"] is not None:
+        output += solution["reduction"] + "\n\n"
+
+    # display order
+    output += "Order: " + str(set(solution["order"])) + '\n\n'
+
+    #  Numbers of psus needed
+    output += "Number of PSUs needed: {}\n\n".format(solution["n_psus"])
+
+    # display psus used
+    for psu in solution["psus"]:
+        output += f"PSU Nr.{psu['psu_nr']}: {psu['items']}" + '\n'
+
+    # display value
+    output += f"\nValue of end state: {solution['value']}\n"
+
+    return output
+
+
+class _Any_Set():
+    """Cancellation token that is set if any of the given tokens is set."""
+    def __init__(self, *tokens):
+        self.tokens = [token for token in tokens if token is not None]
+
+    def is_set(self):
+        return any(token.is_set() for token in self.tokens)
+
+
+class Random_Start():
+    """
+    Start strategy that uses every PSU with the same probability, by default so that a state has as many PSUs as
+    there are ordered items on average.
+    """
+    def __init__(self, probability = None):
+        self.probability = probability
+
+    def __call__(self, psus, k):
+        probability = self.probability
+        if probability is None:
+            probability = min(psus.shape[1] / len(psus), 1)
+        return np.random.random_sample((k, len(psus))) < probability
+
+
+class Greedy_Start():
+    """
+    Start strategy that covers the order greedily with the PSU containing the most uncovered items (see
+    bounds.greedy_cover). Only the first state is the greedy cover, k identical states would all climb the same way,
+    the other states are randomized greedy covers (see GRASP_Start).
+    """
+    def __init__(self, alpha = 0.3):
+        """
+        :param alpha: size of the restricted candidate list of the other states, see GRASP_Start
+        """
+        self.alpha = alpha
+
+    def __call__(self, psus, k):
+        states = np.empty((k, len(psus)), dtype=bool)
+        if k > 0:
+            states[0] = greedy_cover(psus)
+            states[1:] = GRASP_Start(self.alpha)(psus, k - 1)
+        return states
+
+
+class GRASP_Start():
+    """
+    Start strategy that covers the order with a randomized greedy construction (GRASP): every step uses a random
+    PSU of the restricted candidate list, the PSUs whose number of uncovered items is at least
+    max - alpha * (max - min) over the PSUs that cover anything new. alpha = 0 is the greedy cover, alpha = 1 picks
+    any useful PSU. The k states are constructed at once.
+    """
+    def __init__(self, alpha = 0.3):
+        self.alpha = alpha
+
+    def __call__(self, psus, k):
+        states = np.zeros((k, len(psus)), dtype=bool)
+        # items no psu contains can't be covered
+        uncovered = np.tile(np.any(psus, axis=0), (k, 1))
+        psus_float = psus.T.astype(np.float32)
+
+        while np.any(uncovered):
+            rows = np.flatnonzero(np.any(uncovered, axis=1))
+            gains = np.rint(uncovered[rows].astype(np.float32) @ psus_float)
+
+            useful = gains > 0
+            highest = np.amax(gains, axis=1, keepdims=True)
+            lowest = np.amin(np.where(useful, gains, np.inf), axis=1, keepdims=True)
+            candidates = useful & (gains >= highest - self.alpha * (highest - lowest))
+
+            # a uniformly random candidate of every state
+            chosen = np.argmax(np.where(candidates, np.random.random_sample(gains.shape), -1), axis=1)
+
+            states[rows, chosen] = True
+            uncovered[rows] &= ~psus[chosen]
+
+        return states
 
 
 class Hill_Climbing(Abstract_Search):
@@ -180,163 +555,428 @@ class Hill_Climbing(Abstract_Search):
     in the neighborhood (local maximum).
     """
     def search(self, start_state=None):
+        self.reset_search()
 
-        current, value, neighbors, value_neighbors = self.start()
-
+        evaluator, value, value_neighbors = self.start()
+        self.offer(evaluator.state, value)
 
         iteration = 0
 
         while not self.termination(value, value_neighbors):
 
-            t = time.time()
-
             iteration += 1
+            self.counters["iterations"] += 1
 
             # Choose the biggest neighbour
-            max_neighbor = neighbors[np.argmax(np.apply_along_axis(self.value_function, 1, neighbors))]
+            with self.instrumentation.phase("select"):
+                evaluator.flip(np.argmax(value_neighbors))
 
             # Calculate new current and view it
-            current = max_neighbor
-            value = self.value_function(current)
-            if self.log_var == None:
-                print(iteration, value)
-            else:
-                self.log_var.set(value)
-                self.window.update()
-
-            # Create new neighbours and their values
-            neighbors = self.neighbors(current)
-            value_neighbors = np.apply_along_axis(self.value_function, 1, neighbors)
+            value = evaluator.value()
+            self.offer(evaluator.state, value)
+            self.report(iteration, value)
 
-            t = time.time() - t
+            # Evaluate the new neighbours
+            value_neighbors = self.neighbor_values(evaluator)
 
-        return current
+        return evaluator.state
 
 
 class First_Choice_Hill_Climbing(Abstract_Search):
     """
     Starts with a random state and continues with the first better state of its neighborhood until
     there is no improvement possible in the neighborhood (local maximum).
+    The neighbors are visited in a random order and scored in small, growing blocks, so that an iteration stops
+    at the first improvement instead of evaluating the whole neighborhood.
     """
+    # number of neighbors scored at once, the block size doubles up to max_block while no improvement is found
+    min_block = 8
+    max_block = 1024
+
     def search(self):
-        current, value, neighbors, value_neighbors = self.start()
+        self.reset_search()
+
+        evaluator = self.evaluator(self.start_state)
+        value = evaluator.value()
+        self.offer(evaluator.state, value)
 
         iteration = 0
 
-        while not self.termination(value, value_neighbors):
+        while not self.reached_target(value) and not self.stopped():
+            # Choose first neighbour that is better than current state
+            index = self.first_improvement(evaluator, value)
+
+            # no neighbour is better, the state is a local maximum
+            if index is None:
+                break
 
             iteration += 1
+            self.counters["iterations"] += 1
 
-            # Choose first neighbour that is better than current state
-            first_bigger_neighbor = neighbors[np.argmax(value_neighbors > value)]
+            with self.instrumentation.phase("select"):
+                evaluator.flip(index)
 
             # Calculate new current and view it
-            current = first_bigger_neighbor
-            value = self.value_function(current)
-            if self.log_var is not None:    self.log_var.set(value)
-            if self.window is not None:     self.window.update()
+            value = evaluator.value()
+            self.offer(evaluator.state, value)
+            self.report(iteration, value)
 
-            # Create new neighbours and their values
-            neighbors = self.neighbors(current)
-            value_neighbors = np.apply_along_axis(self.value_function, 1, neighbors)
+        return evaluator.state
 
-        return current
+    def first_improvement(self, evaluator, value):
+        """
+        Visits the neighbors of the evaluator's current state in a random order until a better one is found
+
+        :param evaluator: Delta_Evaluator of the current state
+        :param value: value of the current state
+        :return: position of the PSU to flip, None if no neighbor is better or the budget is used up
+        """
+        order = np.random.permutation(len(self.psus))
+        start, block = 0, self.min_block
+
+        while start < len(order) and not self.stopped():
+            indices = order[start:start + block]
+            if not self.affordable(len(indices)):
+                break
+
+            with self.instrumentation.phase("evaluate"):
+                better = np.flatnonzero(evaluator.neighbor_values(indices) > value)
+
+            if better.size > 0:
+                return indices[better[0]]
+
+            start += block
+            block = min(2 * block, self.max_block)
+
+        return None
 
 class Local_Beam_Search(Abstract_Search):
     """
     Starts with k states, does hillclimbing and continues with k best values of the union of the neighborhoods.
+    The neighborhoods of all beams are scored in one array operation. The k beams are always distinct states, and a
+    beam is only replaced by a better state, which guarantees termination.
     """
 
     def search(self, k):
+        self.reset_search()
+
         # initializes k start states
-        k_states = np.random.choice([True, False], (k, len(self.psus)),
-                                    p=[np.count_nonzero(self.order) / len(self.psus),
-                                    1 - (np.count_nonzero(self.order) / len(self.psus))])
+        k_states = self.start_states(k)
+        # the start states are returned unevaluated if even their values don't fit into the budget
+        if not self.affordable(k):
+            return k_states[0]
 
-        # Generate neighbours of current states
-        all_neighbors = np.apply_along_axis(self.neighbors, 1, k_states)
-        all_neighbors = all_neighbors.reshape(-1, all_neighbors.shape[-1])
+        # Evaluate the neighbours of the current states without generating them
+        value_neighbors = self.beam_neighbor_values(k_states)
 
         # If no neighbour is better than worst current state return
-        value_neighbors = np.apply_along_axis(self.value_function, 1, all_neighbors)
-        value = np.amin(np.apply_along_axis(self.value_function, 1, k_states))
+        values = np.apply_along_axis(self.value_function, 1, k_states)
+        value = np.amin(values)
+        self.offer(k_states[np.argmax(values)], np.amax(values))
 
         iteration = 0
 
-        while not self.termination(value, value_neighbors):
+        while not self.termination(value, value_neighbors) and not self.reached_target(np.amax(values)):
 
             iteration += 1
+            self.counters["iterations"] += 1
 
-            # Continue with k best neighbours
-            sort = np.argsort(value_neighbors)
-            k_states = all_neighbors[sort][-k:]
+            # Continue with k best distinct states of the neighbours and the current states, only these get generated
+            with self.instrumentation.phase("select"):
+                k_states, new_values = self.best_distinct_states(k_states, values, value_neighbors, k)
 
-            # Generate neighbours of current states
-            all_neighbors = np.apply_along_axis(self.neighbors, 1, k_states)
-            all_neighbors = all_neighbors.reshape(-1, all_neighbors.shape[-1])
+            # the better neighbours can all be duplicates of current states
+            improved = np.sum(new_values) > np.sum(values)
+            values = new_values
+            if not improved:
+                break
 
             # If no neighbour is better than worst current state return
-            value_neighbors = np.apply_along_axis(self.value_function, 1, all_neighbors)
-            values = np.apply_along_axis(self.value_function, 1, k_states)
+            value_neighbors = self.beam_neighbor_values(k_states)
             value = np.amin(values)
+            self.offer(k_states[np.argmax(values)], np.amax(values))
 
             # Update graph
-            if self.log_var == None:
-                print(iteration, values)
-            else:
-                self.log_var.set(list(values))
-                self.window.update()
+            self.report(iteration, list(values))
+
+        return k_states[np.argmax(values)]
+
+    def best_distinct_states(self, k_states, values, value_neighbors, k):
+        """
+        Selects the k best states of the beams and all their neighbors without duplicates.
+        Only the best candidates are partitioned out and generated, more are taken if there are too many duplicates.
+
+        :param k_states: 2D array with one state per beam
+        :param values: values of the beams
+        :param value_neighbors: values of all neighbors of all beams, as returned by beam_neighbor_values
+        :param k: number of beams
+        :return: 2D array with the selected states sorted by increasing value, and their values
+        """
+        # candidates after the neighbors are the beams themselves
+        value_candidates = np.concatenate((value_neighbors, values))
+
+        # only candidates at least as good as the worst beam can be selected
+        eligible = np.flatnonzero(value_candidates >= np.amin(values))
+        n_candidates = min(2 * k, eligible.size)
+
+        while True:
+            # best candidates first
+            candidates = eligible[np.argpartition(value_candidates[eligible], -n_candidates)[-n_candidates:]]
+            candidates = candidates[np.argsort(-value_candidates[candidates], kind="stable")]
 
-        return k_states[-1]
+            is_neighbor = candidates < value_neighbors.size
+            states = k_states[np.where(is_neighbor, candidates // len(self.psus), candidates - value_neighbors.size)]
+            states[np.flatnonzero(is_neighbor), candidates[is_neighbor] % len(self.psus)] ^= True
 
+            # remove duplicates by their packed state, the first (best) copy is kept
+            # every packed state is compared as one bytes value, much faster than np.unique along an axis
+            packed = np.packbits(states, axis=1)
+            _, first = np.unique(packed.view(np.dtype((np.void, packed.shape[1]))).ravel(), return_index=True)
+
+            if len(first) >= k or n_candidates == eligible.size:
+                break
+            n_candidates = min(2 * n_candidates, eligible.size)
+
+        chosen = np.sort(first)[:k][::-1]
+
+        return states[chosen], value_candidates[candidates[chosen]]
+
+    def beam_neighbor_values(self, k_states):
+        """
+        Evaluates the neighbors of all beams in one array operation
+
+        :param k_states: 2D array with one state per beam
+        :return: array with the values of all neighbors of all beams, empty once the search is stopped
+        """
+        if self.stopped() or not self.affordable(k_states.size):
+            return np.empty(0, dtype=np.intp)
+
+        self.counters["neighborhood_evaluations"] += len(k_states)
+        self.counters["evaluations"] += k_states.size
+
+        with self.instrumentation.phase("evaluate"):
+            return neighbor_values(k_states, self.psus).reshape(-1)
+
+
+
+class Vectorized_Hillclimbing(Abstract_Search):
+    """
+    Performs k independent hillclimb searches like Parallel_Hillclimbing, but in this process: the k states are the rows
+    of one matrix, and the neighborhoods of all climbs are scored in one array operation per step. Climbs that reached
+    a local maximum are masked out, the others move to their best neighbor.
+    """
+    # largest number of neighbor values computed at once, more climbs are scored in several blocks
+    max_block_entries = 1 << 22
+
+    def search(self, k):
+        self.reset_search()
+
+        # initialize k start states
+        states = self.start_states(k)
+        # the start states are returned unevaluated if even their values don't fit into the budget
+        if not self.affordable(k):
+            return states[0]
+
+        # how often every order item is covered by every climb, updated with every flip
+        counts = coverage_counts(states, self.psus)
+        values = state_values(states, counts)
+        self.counters["evaluations"] += k
+
+        # climbs that have not reached a local maximum yet
+        active = np.ones(k, dtype=bool)
+        self.offer(states[np.argmax(values)], np.amax(values))
+
+        iteration = 0
+
+        while np.any(active) and not self.reached_target(np.amax(values)) and not self.stopped():
+
+            rows = np.flatnonzero(active)
+            if not self.affordable(rows.size * len(self.psus)):
+                break
+            best, best_values = self.best_neighbors(states[rows], counts[rows])
+
+            # climbs without a better neighbor are finished
+            improving = best_values > values[rows]
+            active[rows[~improving]] = False
+            rows, best = rows[improving], best[improving]
+
+            if len(rows) == 0:
+                break
+
+            iteration += 1
+            self.counters["iterations"] += 1
+
+            # Move every improving climb to its best neighbor
+            with self.instrumentation.phase("select"):
+                signs = np.where(states[rows, best], -1, 1)
+                counts[rows] += signs[:, np.newaxis] * self.psus[best]
+                states[rows, best] ^= True
+                values[rows] = best_values[improving]
+
+            self.offer(states[np.argmax(values)], np.amax(values))
+
+            # Update graph
+            self.report(iteration, list(values))
+
+        return states[np.argmax(values)]
+
+    def best_neighbors(self, states, counts):
+        """
+        Finds the best neighbor of every state, scoring the neighborhoods in blocks of states
+
+        :param states: 2D array with one state per climb
+        :param counts: 2D array with the coverage counts of every state
+        :return: position of the PSU to flip for the best neighbor of every state, and the values of these neighbors
+        """
+        self.counters["neighborhood_evaluations"] += len(states)
+        self.counters["evaluations"] += states.size
+
+        block_size = max(1, self.max_block_entries // states.shape[1])
+        best = np.empty(len(states), dtype=np.intp)
+        best_values = np.empty(len(states), dtype=np.intp)
+
+        with self.instrumentation.phase("evaluate"):
+            for start in range(0, len(states), block_size):
+                block = slice(start, start + block_size)
+                value_neighbors = neighbor_values(states[block], self.psus, counts[block])
+                best[block] = np.argmax(value_neighbors, axis=1)
+                best_values[block] = value_neighbors[np.arange(len(value_neighbors)), best[block]]
+
+        return best, best_values
+
+
+class Exponential_Schedule():
+    """
+    Cooling schedule that multiplies the temperature by a constant factor every step.
+    Either the factor is given, or it is chosen so that the temperature falls from start to end in the given steps.
+    """
+    def __init__(self, start = 2.0, end = 0.01, steps = None, factor = None):
+        self.start = start
+        self.end = end
+        self.steps = steps
+        self.factor = factor
+
+    def __call__(self, t, steps = None):
+        factor = self.factor
+        if factor is None:
+            factor = (self.end / self.start) ** (1 / max((self.steps or steps) - 1, 1))
+        return self.start * factor ** t
+
+
+class Linear_Schedule():
+    """
+    Cooling schedule that lowers the temperature linearly from start to zero over the given steps.
+    """
+    def __init__(self, start = 2.0, steps = None):
+        self.start = start
+        self.steps = steps
+
+    def __call__(self, t, steps = None):
+        return self.start * max(1 - t / (self.steps or steps), 0)
+
+
+class Logarithmic_Schedule():
+    """
+    Cooling schedule T = start / log(t + 2), which cools very slowly.
+    """
+    def __init__(self, start = 2.0):
+        self.start = start
+
+    def __call__(self, t, steps = None):
+        return self.start / log(t + 2)
 
 
 class Simulated_Annealing(Abstract_Search):
+    """
+    Flips random PSUs, accepts worse states with probability e^(∆E / temperature) and finishes with a hillclimb from
+    the end state. The annealing can be restarted from new random states, the best state found is returned.
+    """
+
+    # schedule of the original implementation, 100 * 0.9 ** t for 500 steps
+    default_schedule = Exponential_Schedule(start = 100, factor = 0.9)
+    default_steps = 500
 
     def schedule(self, t):
-        return 100 * 0.9 ** t
+        return self.default_schedule(t, self.default_steps)
 
-    def search(self):
+    def search(self, schedule = None, max_steps = None, time_limit = None, restarts = 0):
+        """
+        :param schedule: cooling schedule, a function of the step (and the number of steps), defaults to schedule
+        :param max_steps: number of annealing steps per run, defaults to default_steps
+        :param time_limit: wall-clock limit in seconds per annealing run, the final hillclimb is always done
+        :param restarts: number of additional runs from new start states of the start strategy
+        :return: best state found
+        """
+        self.reset_search()
+        max_steps = self.default_steps if max_steps is None else max_steps
 
-        current = self.start_state
+        t = 0
 
-        for t in count():
+        # the start states of the restarts are drawn at once, so that strategies like Greedy_Start vary them
+        # the first of them stands for the start state, which the first run uses
+        restart_states = self.start_states(restarts + 1) if restarts > 0 else None
 
-            # Updates temperature using the time schedule
-            temp = self.schedule(t)
+        for run in range(restarts + 1):
+            evaluator = self.evaluator(self.start_state if run == 0 else restart_states[run])
+            stop_time = None if time_limit is None else time.time() + time_limit
+            # the value of the start state comes from the coverage counts, like all values of the annealing
+            self.offer(evaluator.state, evaluator.value())
 
-            # Returns current state if temperature is 0
-            if t == 500:
-                final_hc = Hill_Climbing(self.directories[0], self.directories[1], self.log_var, self.window)
-                final_hc.start_state = current
-                return final_hc.search()
+            for step in range(max_steps):
+                if not self.affordable(1):
+                    break
 
-            # Choose random neighbour and calculates ∆E
-            next_neighbor = random.choice(self.neighbors(current))
-            delta_e = self.value_function(next_neighbor) - self.value_function(current)
+                # Updates temperature using the time schedule
+                temp = self.schedule(step) if schedule is None else schedule(step, max_steps)
+                self.counters["iterations"] += 1
 
-            # If the random neighbour is better, continue search with it
-            if delta_e > 0:
-                current = next_neighbor
+                # Choose random neighbour and calculates ∆E
+                next_neighbor = random.randrange(len(self.psus))
+                with self.instrumentation.phase("evaluate"):
+                    delta_e = evaluator.flip_delta(next_neighbor)
 
-            # If it is worse, continue with the random neighbour
-            # with probability e^(∆E / temperature)
-            else:
-                if random.random() < exp(delta_e / temp):
-                    current = next_neighbor
+                # If the random neighbour is better, continue search with it
+                # If it is worse, continue with the random neighbour
+                # with probability e^(∆E / temperature)
+                with self.instrumentation.phase("select"):
+                    # delta_e is a numpy integer, dividing it by a temperature that underflowed to almost 0 overflows,
+                    # as python float it doesn't and the clamped exponent keeps exp in range
+                    if delta_e > 0 or (temp > 0 and random.random() < exp(max(float(delta_e) / temp, -700.0))):
+                        evaluator.flip(next_neighbor)
 
-            # Update graph
-            value = self.value_function(current)
-            if self.log_var == None:
-                print(t, value)
-            else:
-                self.log_var.set(value)
-                self.window.update()
+                # Update graph
+                value = evaluator.value()
+                self.offer(evaluator.state, value)
+                self.report(t, value)
+                t += 1
+
+                if (self.reached_target(value) or self.stopped() or
+                        (stop_time is not None and time.time() > stop_time)):
+                    break
+
+            # the annealing's best state is returned without polishing once the budget is used up
+            if self.stopped():
+                break
+
+            # Final hillclimb on the already loaded problem
+            final_hc = Hill_Climbing.from_search(self)
+            final_hc.start_state = evaluator.state
+            state = final_hc.search()
+            self.exhausted = self.exhausted or final_hc.exhausted
+
+            self.offer(state, final_hc.value_function(state))
+
+            if self.reached_target(self.incumbent_value) or self.stopped():
+                break
+
+        # the best state of the annealing can be better than the polished end states if the budget ran out
+        return self.incumbent
 
 
 
 ''' Testing the Search '''
 
 if __name__ == '__main__':
-    s = Simulated_Annealing('data/problem1.txt', 'data/order11.txt')
-    s.search()
+    # see solve.py for the arguments
+    from solve import main
+    main()
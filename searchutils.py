@@ -1,7 +1,11 @@
-""" Contains a function that returns the neighbors of a state, and a function that computes the value of a state. """
+""" Contains a function that returns the neighbors of a state, a function that computes the value of a state,
+and an evaluator that updates the value of a state incrementally when single PSUs are flipped. """
+
+from collections import Counter
 
 import numpy as np
 
+
 def neighbors_func(state):
     """
     Creates all neighbors of a given state
@@ -48,3 +52,187 @@ def value_function(state, order, psus):
     # else elements are missing
     else:
         return -1 * (np.size(items) - np.count_nonzero(items))
+
+
+def value_from_counts(n_selected, n_missing, n_psus):
+    """
+    Computes the value of a state from its summary statistics, mirroring value_function
+
+    :param n_selected: number of PSUs used in the state
+    :param n_missing: number of order items not covered by the state
+    :param n_psus: total number of PSUs
+    :return: value of state
+    """
+    # if the state is empty
+    if n_selected == 0:
+        return -10 * n_psus
+    # if all elements are covered, minimize the amount of used psus
+    if n_missing == 0:
+        return n_psus - n_selected
+    # else elements are missing
+    return -1 * n_missing
+
+
+def count_matches(mask, psus):
+    """
+    Counts for every PSU how many of the masked order items it contains
+
+    :param mask: binary array (or 2d array with one row per state) over the order items
+    :param psus: 2d array containing binary representation of all psus
+    :return: array (or 2d array) with one count per PSU
+    """
+    if mask.ndim == 1:
+        return np.count_nonzero(psus & mask, axis=1)
+
+    # several masks at once are cheaper as one matrix product
+    return np.rint(mask.astype(np.float32) @ psus.T.astype(np.float32)).astype(np.intp)
+
+
+def coverage_counts(state, psus):
+    """
+    Counts how often every order item is covered by the PSUs used in a state
+
+    :param state: binary array describing used PSUs, or 2d array with one state per row
+    :param psus: 2d array containing binary representation of all psus
+    :return: array (or 2d array) with one count per order item
+    """
+    if state.ndim == 1:
+        return np.count_nonzero(psus[state], axis=0)
+
+    return np.rint(state.astype(np.float32) @ psus.astype(np.float32)).astype(np.intp)
+
+
+def state_values(states, counts):
+    """
+    Evaluates several states at once from their coverage counts, mirroring value_function
+
+    :param states: 2d array with one binary state per row
+    :param counts: 2d array with the coverage counts of every state, see coverage_counts
+    :return: array with the value of every state
+    """
+    n_psus = states.shape[-1]
+    n_selected = np.count_nonzero(states, axis=-1)
+    n_missing = np.count_nonzero(counts == 0, axis=-1)
+
+    return np.where(n_selected == 0, -10 * n_psus, np.where(n_missing == 0, n_psus - n_selected, -1 * n_missing))
+
+
+def neighbor_values(state, psus, counts=None, indices=None):
+    """
+    Evaluates all neighbors of a state in one array operation, without creating the neighbors
+
+    :param state: binary array describing used PSUs, or 2d array with one state per row
+    :param psus: 2d array containing binary representation of all psus
+    :param counts: how often every order item is covered by the state, computed if not given
+    :param indices: positions of the PSUs to flip, all PSUs if not given
+    :return: array (or 2d array) with the value of the neighbor created by flipping each PSU
+    """
+    if counts is None:
+        counts = coverage_counts(state, psus)
+
+    n_psus = state.shape[-1]
+    n_selected = np.count_nonzero(state, axis=-1)[..., np.newaxis]
+    n_missing = np.count_nonzero(counts == 0, axis=-1)[..., np.newaxis]
+
+    flipped = state
+    if indices is not None:
+        flipped = state[..., indices]
+        psus = psus[indices]
+
+    # removing a psu loses the items only it covers, adding one gains the items nobody covers
+    lost = count_matches(counts == 1, psus)
+    gained = count_matches(counts == 0, psus)
+
+    n_selected = n_selected + np.where(flipped, -1, 1)
+    n_missing = n_missing + np.where(flipped, lost, -gained)
+
+    # same cases as in value_function
+    return np.where(n_selected == 0, -10 * n_psus,
+                    np.where(n_missing == 0, n_psus - n_selected, -1 * n_missing))
+
+
+class Delta_Evaluator():
+    """
+    Keeps the coverage count of every order item for a current state, so that the value change of
+    flipping a single PSU can be computed from just the items of that PSU.
+    """
+    def __init__(self, state, psus, counters=None):
+        """
+        :param state: binary array describing used PSUs
+        :param psus: 2d array containing binary representation of all psus
+        :param counters: Counter that the number of evaluated states is added to
+        """
+        self.counters = Counter() if counters is None else counters
+        self.psus = psus
+        # the order items of every psu as index arrays
+        self.psu_items = [np.flatnonzero(psu) for psu in psus]
+        self.reset(state)
+
+    def reset(self, state):
+        """
+        Sets a new current state and recomputes the coverage counts from scratch
+
+        :param state: binary array describing used PSUs
+        """
+        self.state = np.array(state, dtype=bool)
+        self.counts = coverage_counts(self.state, self.psus)
+        self.n_selected = np.count_nonzero(self.state)
+        self.n_missing = np.size(self.counts) - np.count_nonzero(self.counts)
+
+    def value(self):
+        """
+        :return: value of the current state
+        """
+        return value_from_counts(self.n_selected, self.n_missing, np.size(self.state))
+
+    def flip_value(self, index):
+        """
+        Computes the value the current state would have if one PSU was flipped
+
+        :param index: position of the PSU to flip
+        :return: value of the neighbor
+        """
+        self.counters["evaluations"] += 1
+        counts = self.counts[self.psu_items[index]]
+
+        if self.state[index]:
+            # items only covered by this psu become missing
+            return value_from_counts(self.n_selected - 1, self.n_missing + np.count_nonzero(counts == 1),
+                                     np.size(self.state))
+        # items not covered so far become covered
+        return value_from_counts(self.n_selected + 1, self.n_missing - np.count_nonzero(counts == 0),
+                                 np.size(self.state))
+
+    def neighbor_values(self, indices=None):
+        """
+        :param indices: positions of the PSUs to flip, all PSUs if not given
+        :return: array with the value of every (or every selected) neighbor of the current state
+        """
+        self.counters["evaluations"] += np.size(self.state) if indices is None else np.size(indices)
+        return neighbor_values(self.state, self.psus, self.counts, indices=indices)
+
+    def flip_delta(self, index):
+        """
+        :param index: position of the PSU to flip
+        :return: value change of flipping the PSU
+        """
+        return self.flip_value(index) - self.value()
+
+    def flip(self, index):
+        """
+        Flips one PSU of the current state in place and updates the coverage counts
+
+        :param index: position of the PSU to flip
+        """
+        items = self.psu_items[index]
+
+        if self.state[index]:
+            self.counts[items] -= 1
+            self.n_missing += np.count_nonzero(self.counts[items] == 0)
+            self.n_selected -= 1
+        else:
+            self.n_missing -= np.count_nonzero(self.counts[items] == 0)
+            self.counts[items] += 1
+            self.n_selected += 1
+
+        self.state[index] = not self.state[index]
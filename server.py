@@ -0,0 +1,276 @@
+"""Contains the resident solver service, which keeps warehouses loaded and solves orders sent as JSON."""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from solve import algorithm_lookup
+from listvar import QuietVar
+from warehouse import Warehouse
+
+
+class Solver_Server():
+    """
+    Accepts connections on a unix domain socket or a localhost port. Every line a client sends is one JSON request,
+    every request is answered with one JSON line as soon as it is solved, answers can arrive out of order.
+
+    Request: {"id": any, "warehouse": path, "order": [items], "algorithm": name (see solve.algorithm_lookup),
+              "args": [search arguments], "budget": seconds, "seed": int, "reduce": bool}
+    Only warehouse and order are required. Orders are sent as items, the server never opens order files, a client
+    reads its order files itself. Only the preloaded warehouses and the warehouses in the data directory are solved.
+    Answer: {"id": ..., "value": ..., "order": [...], "n_psus": ..., "psus": [{"psu_nr": ..., "items": [...]}],
+             "budget_exhausted": bool, "seconds": ...} (see Abstract_Search.solution_dict), or
+            {"id": ..., "error": message}
+    A search that exhausts its budget is answered with the best solution it found so far. The budget and the
+    answer's seconds start when the request arrives, waiting for a worker counts.
+
+    The searches run in a process pool whose workers keep every warehouse they used loaded from its binary cache.
+    At most max_pending requests are solved or waiting for a worker, beyond that the server stops reading
+    requests until a request is finished.
+    """
+    def __init__(self, processes = None, max_pending = None, warehouses = (), default_budget = None,
+                 data_directory = None):
+        """
+        :param processes: number of worker processes, defaults to the number of cores
+        :param max_pending: number of requests in the pool at the same time, defaults to twice the processes
+        :param warehouses: paths of warehouses that every worker loads at its start
+        :param default_budget: time budget in seconds of requests without budget, None for no limit
+        :param data_directory: directory whose warehouses (also in subdirectories) are solved besides the preloaded
+                               ones, None for only the preloaded warehouses
+        """
+        self.processes = processes or os.cpu_count()
+        self.max_pending = max_pending or 2 * self.processes
+        self.warehouses = [os.path.abspath(path) for path in warehouses]
+        self.default_budget = default_budget
+        self.data_directory = None if data_directory is None else os.path.realpath(data_directory)
+
+        self.compiled = set()
+        self.executor = None
+        self.pending = None
+
+    async def serve(self, port = None, path = None):
+        """
+        Runs the server until it is cancelled
+
+        :param port: localhost port
+        :param path: path of a unix domain socket, used if no port is given
+        """
+        # compile once here instead of in every worker
+        for warehouse in self.warehouses:
+            Warehouse.load(warehouse)
+            self.compiled.add(warehouse)
+
+        self.pending = asyncio.Semaphore(self.max_pending)
+        self.executor = ProcessPoolExecutor(self.processes, initializer = _init_worker,
+                                            initargs = (self.warehouses,))
+        try:
+            if port is not None:
+                server = await asyncio.start_server(self.handle, "127.0.0.1", port)
+            else:
+                server = await asyncio.start_unix_server(self.handle, path)
+
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures = True)
+            if port is None and os.path.exists(path):
+                os.remove(path)
+
+    async def handle(self, reader, writer):
+        """
+        Reads the requests of one connection and answers them concurrently
+        """
+        tasks = set()
+        lock = asyncio.Lock()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # the budget of a request starts when it arrives, waiting for the pool counts
+                arrival = time.time()
+
+                # backpressure: no more requests are read while the pool is full
+                await self.pending.acquire()
+
+                task = asyncio.create_task(self.answer(line, writer, lock, arrival))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, line, writer, lock, arrival = None):
+        """
+        Solves one request in the pool and writes the answer
+
+        :param arrival: time at which the request arrived, now if not given
+        """
+        arrival = time.time() if arrival is None else arrival
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            answer = await self.solve(request, arrival)
+        except Exception as err:
+            answer = {"error": repr(err)}
+        finally:
+            self.pending.release()
+
+        answer["id"] = request_id
+
+        async with lock:
+            writer.write(json.dumps(answer).encode() + b"\n")
+            await writer.drain()
+
+    def allowed(self, warehouse):
+        """
+        :param warehouse: absolute path of a warehouse file
+        :return: whether the warehouse was preloaded or is in the data directory
+        """
+        if warehouse in self.warehouses:
+            return True
+
+        # symbolic links are resolved, so that they can't point out of the data directory
+        return (self.data_directory is not None and
+                os.path.commonpath([self.data_directory, os.path.realpath(warehouse)]) == self.data_directory)
+
+    async def solve(self, request, arrival = None):
+        """
+        :param request: request dict, see Solver_Server
+        :param arrival: time at which the request arrived, the budget and the answer's seconds start then, now if
+                        not given
+        :return: answer dict
+        """
+        arrival = time.time() if arrival is None else arrival
+        loop = asyncio.get_running_loop()
+        warehouse = os.path.abspath(request["warehouse"])
+
+        # the server never opens files a client names outside of its warehouses, the path isn't echoed either
+        if not self.allowed(warehouse):
+            raise PermissionError("The warehouse is not preloaded and not in the data directory")
+
+        if warehouse not in self.compiled:
+            await loop.run_in_executor(None, Warehouse.load, warehouse)
+            self.compiled.add(warehouse)
+
+        job = (warehouse, request["order"], request.get("algorithm", "hillclimbing"), tuple(request.get("args", ())),
+               request.get("budget", self.default_budget), arrival, request.get("seed"), request.get("reduce", False))
+
+        return await loop.run_in_executor(self.executor, _solve, job)
+
+
+# warehouses of a worker process by path
+_warehouses = {}
+
+def _init_worker(warehouses):
+    for path in warehouses:
+        _warehouses[path] = Warehouse.load(path)
+
+
+def _solve(job):
+    """
+    Solves one request in a worker process
+    :param job: warehouse path, ordered items, algorithm name, search arguments, budget, arrival time of the
+                request, seed and reduce
+    :return: answer dict
+    """
+    warehouse_path, order_raw, algorithm, args, budget, arrival, seed, reduce = job
+
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
+
+    if warehouse_path not in _warehouses:
+        _warehouses[warehouse_path] = Warehouse.load(warehouse_path)
+
+    quiet = QuietVar()
+    alg = algorithm_lookup[algorithm].from_problem(*_warehouses[warehouse_path].order_problem(order_raw),
+                                                   quiet, quiet, reduce = reduce)
+    # at the end of the budget the search returns the best state found so far
+    alg.set_budget(deadline = None if budget is None else arrival + budget)
+
+    state = alg.search(*args)
+
+    answer = alg.solution_dict(state)
+    answer["budget_exhausted"] = alg.stopped()
+    answer["seconds"] = time.time() - arrival
+
+    return answer
+
+
+def request(requests, port = None, path = None):
+    """
+    Sends requests to a running server and waits for all answers
+
+    :param requests: list of request dicts, see Solver_Server
+    :param port: localhost port of the server
+    :param path: path of the unix domain socket of the server, used if no port is given
+    :return: list of answer dicts, in the order in which they arrived
+    """
+    if port is not None:
+        connection = socket.create_connection(("127.0.0.1", port))
+    else:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(path)
+
+    with connection, connection.makefile("rw") as stream:
+        for single_request in requests:
+            stream.write(json.dumps(single_request) + "\n")
+        stream.flush()
+
+        return [json.loads(stream.readline()) for _ in requests]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Runs the solver service, or sends an order to it.")
+    parser.add_argument("--port", type = int, default = None, help = "localhost port")
+    parser.add_argument("--socket", default = "solver.sock", help = "unix domain socket, used if no port is given")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    serve_parser = subparsers.add_parser("serve", help = "run the server")
+    serve_parser.add_argument("warehouses", nargs = "*", help = "warehouse files to load at the start")
+    serve_parser.add_argument("--processes", type = int, default = None, help = "number of worker processes")
+    serve_parser.add_argument("--max-pending", type = int, default = None,
+                              help = "number of requests in the pool at the same time")
+    serve_parser.add_argument("--budget", type = float, default = None, help = "default time budget in seconds")
+    serve_parser.add_argument("--data-directory", default = None,
+                              help = "also solve the warehouses in this directory, not only the preloaded ones")
+
+    solve_parser = subparsers.add_parser("solve", help = "send an order and print the answer")
+    solve_parser.add_argument("warehouse", help = "warehouse file")
+    solve_parser.add_argument("order", help = "order file")
+    solve_parser.add_argument("--algorithm", choices = list(algorithm_lookup), default = "hillclimbing")
+    solve_parser.add_argument("--budget", type = float, default = None, help = "time budget in seconds")
+    arguments = parser.parse_args()
+
+    if arguments.command == "serve":
+        server = Solver_Server(arguments.processes, arguments.max_pending, arguments.warehouses, arguments.budget,
+                               arguments.data_directory)
+        try:
+            asyncio.run(server.serve(arguments.port, arguments.socket))
+        except KeyboardInterrupt:
+            pass
+    else:
+        with open(arguments.order) as f:
+            order_raw = f.read().split()
+
+        single_request = {"warehouse": os.path.abspath(arguments.warehouse), "order": order_raw,
+                          "algorithm": arguments.algorithm}
+        if arguments.budget is not None:
+            single_request["budget"] = arguments.budget
+
+        print(json.dumps(request([single_request], arguments.port, arguments.socket)[0], indent = 2))
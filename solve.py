@@ -0,0 +1,162 @@
+"""Contains the headless solver: solves one order from the command line without the GUI."""
+
+import argparse
+import importlib
+import json
+import random
+import time
+
+import numpy as np
+
+from search import Hill_Climbing, First_Choice_Hill_Climbing, Local_Beam_Search, Simulated_Annealing, \
+    Vectorized_Hillclimbing, Random_Start, Greedy_Start, GRASP_Start, format_solution
+from listvar import QuietVar
+
+
+# algorithms that run in this process, by name
+algorithm_lookup = {
+    "hillclimbing": Hill_Climbing,
+    "first-choice-hillclimbing": First_Choice_Hill_Climbing,
+    "local-beam-search": Local_Beam_Search,
+    "simulated-annealing": Simulated_Annealing,
+    "vectorized-hillclimbing": Vectorized_Hillclimbing,
+}
+
+# algorithms that start worker processes, by name: module and class name, imported only when used
+process_algorithms = {
+    "parallel-hillclimbing": ("parallel_hillclimbing", "Parallel_Hillclimbing"),
+}
+
+# strategies for the start states, by name
+start_strategies = {
+    "random": Random_Start,
+    "greedy": Greedy_Start,
+    "grasp": GRASP_Start,
+}
+
+# algorithms whose search takes the number of beams / climbs as argument
+k_algorithms = {"local-beam-search", "vectorized-hillclimbing", "parallel-hillclimbing"}
+
+
+def algorithm_class(name):
+    """
+    :param name: name of the algorithm, see algorithm_lookup and process_algorithms
+    :return: algorithm class
+    """
+    if name in algorithm_lookup:
+        return algorithm_lookup[name]
+
+    module, class_name = process_algorithms[name]
+    return getattr(importlib.import_module(module), class_name)
+
+
+def search_arguments(name, k = 4):
+    """
+    :param name: name of the algorithm
+    :param k: number of beams or climbs
+    :return: arguments of the algorithm's search method
+    """
+    return (k,) if name in k_algorithms else ()
+
+
+def start_strategy(name, alpha = 0.3):
+    """
+    :param name: name of the start strategy, see start_strategies
+    :param alpha: size of the restricted candidate list of the grasp start and of all but the first state of the
+                  greedy start, see GRASP_Start
+    :return: start strategy
+    """
+    return start_strategies[name]() if name == "random" else start_strategies[name](alpha)
+
+
+def solve(warehouse, order, algorithm = "hillclimbing", args = None, seed = None, time_limit = None,
+          max_evaluations = None, stop_at_bound = False, reduce = False, cache = False, start = None, log_var = None):
+    """
+    Solves one order
+
+    :param warehouse: path of the warehouse file
+    :param order: path of the order file
+    :param algorithm: name of the algorithm, see algorithm_class
+    :param args: arguments of the algorithm's search method, see search_arguments if not given
+    :param seed: random seed
+    :param time_limit: wall-clock limit in seconds, the best solution so far is returned when it is reached
+    :param max_evaluations: maximal number of evaluated states
+    :param stop_at_bound: stop the search as soon as it reaches the lower bound
+    :param reduce: search the reduced problem, see reduction.Reduction
+    :param cache: load the warehouse from its compiled binary cache, see warehouse.Warehouse
+    :param start: start strategy, see Abstract_Search.set_start_strategy, random if not given
+    :param log_var: receives the progress of the search, nothing is shown if not given
+    :return: solution dict (see Abstract_Search.solution_dict) with whether the budget was exhausted and the time
+    """
+    t = time.time()
+
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
+
+    log_var = QuietVar() if log_var is None else log_var
+    alg = algorithm_class(algorithm)(warehouse, order, log_var, log_var, cache = cache, reduce = reduce)
+    try:
+        if start is not None:
+            alg.set_start_strategy(start)
+        if stop_at_bound:
+            alg.set_target_value()
+        alg.set_budget(time_limit = time_limit, max_evaluations = max_evaluations)
+
+        state = alg.search(*(search_arguments(algorithm) if args is None else args))
+
+        answer = alg.solution_dict(state)
+        answer["budget_exhausted"] = alg.stopped()
+    finally:
+        alg.close()
+
+    answer["seconds"] = time.time() - t
+
+    return answer
+
+
+def main(argv = None):
+    """
+    Command line entry point, prints the solution of one order
+
+    :param argv: command line arguments, sys.argv if not given
+    """
+    algorithms = list(algorithm_lookup) + list(process_algorithms)
+
+    parser = argparse.ArgumentParser(description = "Solves an order without the GUI.")
+    parser.add_argument("warehouse", help = "warehouse file")
+    parser.add_argument("order", help = "order file")
+    parser.add_argument("--algorithm", choices = algorithms, default = "hillclimbing")
+    parser.add_argument("--k", type = int, default = 4, help = "number of beams or climbs, if the algorithm has any")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--time-limit", type = float, default = None, help = "time budget in seconds")
+    parser.add_argument("--max-evaluations", type = int, default = None, help = "maximal number of evaluated states")
+    parser.add_argument("--stop-at-bound", action = "store_true",
+                        help = "stop the search as soon as it reaches the lower bound")
+    parser.add_argument("--reduce", action = "store_true", help = "search the reduced problem")
+    parser.add_argument("--cache", action = "store_true", help = "load the warehouse from its compiled binary cache")
+    parser.add_argument("--start", choices = list(start_strategies), default = "random",
+                        help = "how the start states are created")
+    parser.add_argument("--alpha", type = float, default = 0.3,
+                        help = "size of the restricted candidate list of the grasp start and of all but the first "
+                             "greedy start state, 0 is greedy")
+    parser.add_argument("--json", action = "store_true", help = "print the solution as JSON")
+    arguments = parser.parse_args(argv)
+
+    answer = solve(arguments.warehouse, arguments.order, arguments.algorithm,
+                   search_arguments(arguments.algorithm, arguments.k), arguments.seed, arguments.time_limit,
+                   arguments.max_evaluations, arguments.stop_at_bound, arguments.reduce, arguments.cache,
+                   start_strategy(arguments.start, arguments.alpha))
+
+    if arguments.json:
+        print(json.dumps(answer, indent = 2))
+        return
+
+    print(format_solution(answer))
+    if answer["budget_exhausted"]:
+        print("The budget was exhausted, this is the best solution found so far.")
+    print(f"Solved in {answer['seconds']:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Contains caches for the values of states, one for a single process and one in shared memory for process pools."""
+
+import hashlib
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+
+def state_key(state):
+    """
+    :param state: binary array describing used PSUs
+    :return: bytes of the packed state, used as key of the caches
+    """
+    return np.packbits(state).tobytes()
+
+
+class LRU_Value_Cache():
+    """
+    Keeps the values of the most recently used states of one process, up to a memory cap.
+    """
+    # estimated bytes per entry besides the key: dict entry, links of the ordered dict and the value
+    entry_overhead = 120
+
+    def __init__(self, max_bytes = 64 * 2 ** 20, max_entries = None):
+        """
+        :param max_bytes: memory cap of the cache
+        :param max_entries: maximal number of cached states, no limit if not given
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, state):
+        """
+        :param state: binary array describing used PSUs
+        :return: cached value of the state, None if it is not cached
+        """
+        key = state_key(state)
+        value = self.entries.get(key)
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, state, value):
+        """
+        Caches the value of a state, the least recently used states are removed if the cache is full
+
+        :param state: binary array describing used PSUs
+        :param value: value of the state
+        """
+        key = state_key(state)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+
+        self.entries[key] = value
+        self.nbytes += sys.getsizeof(key) + self.entry_overhead
+
+        while self.entries and (self.nbytes > self.max_bytes or
+                                (self.max_entries is not None and len(self.entries) > self.max_entries)):
+            key, _ = self.entries.popitem(last = False)
+            self.nbytes -= sys.getsizeof(key) + self.entry_overhead
+            self.evictions += 1
+
+    def stats(self):
+        """
+        :return: dict with the hits, misses, hit rate, evictions, number of entries and estimated bytes
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions, "entries": len(self.entries), "bytes": self.nbytes}
+
+
+class Shared_Value_Cache():
+    """
+    Keeps values of states in shared memory, so that all processes of a pool can use the same cache. Every state has
+    exactly one slot (direct mapped), a new state overwrites the state in its slot.
+    There are no locks: every slot stores a checksum of its key and value, a slot that is read while another
+    process writes it counts as a miss. Pass the cache to the worker processes (e.g. as initargs), it is pickled
+    by the name of its shared memory. Stats are counted per process.
+    """
+    def __init__(self, n_psus, max_bytes = 64 * 2 ** 20):
+        """
+        :param n_psus: length of the cached states
+        :param max_bytes: size of the shared memory
+        """
+        self.key_bytes = -(-n_psus // 8)
+        self.n_slots = max(1, max_bytes // (self.key_bytes + 16))
+
+        from multiprocessing import shared_memory
+
+        self.shared = shared_memory.SharedMemory(create = True, size = self.n_slots * (self.key_bytes + 16))
+        self.owner = True
+        self._attach()
+
+    def _attach(self):
+        # keys, values and checksums of the slots, all zero is an invalid slot
+        self.values = np.ndarray(self.n_slots, np.int64, buffer = self.shared.buf)
+        self.checks = np.ndarray(self.n_slots, np.uint64, buffer = self.shared.buf, offset = 8 * self.n_slots)
+        self.keys = np.ndarray((self.n_slots, self.key_bytes), np.uint8, buffer = self.shared.buf,
+                               offset = 16 * self.n_slots)
+        self.hits = self.misses = self.evictions = 0
+
+    def __getstate__(self):
+        return {"name": self.shared.name, "key_bytes": self.key_bytes, "n_slots": self.n_slots}
+
+    def __setstate__(self, state):
+        self.key_bytes, self.n_slots = state["key_bytes"], state["n_slots"]
+        from multiprocessing import shared_memory
+
+        self.shared = shared_memory.SharedMemory(name = state["name"])
+        self.owner = False
+        self._attach()
+
+    def _slot(self, key):
+        # python's hash of bytes differs between processes
+        key_hash = int.from_bytes(hashlib.blake2b(key, digest_size = 8).digest(), "little")
+        return key_hash % self.n_slots, key_hash
+
+    def get(self, state):
+        """
+        :param state: binary array describing used PSUs
+        :return: cached value of the state, None if it is not cached
+        """
+        key = state_key(state)
+        slot, key_hash = self._slot(key)
+
+        value = int(self.values[slot])
+        if (int(self.checks[slot]) == key_hash ^ (value & 0xFFFFFFFFFFFFFFFF) and
+                self.keys[slot].tobytes() == key):
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    def put(self, state, value):
+        """
+        Caches the value of a state in its slot
+
+        :param state: binary array describing used PSUs
+        :param value: value of the state
+        """
+        key = state_key(state)
+        slot, key_hash = self._slot(key)
+
+        if self.checks[slot] != 0:
+            self.evictions += 1
+
+        self.keys[slot] = np.frombuffer(key, np.uint8)
+        self.values[slot] = value
+        self.checks[slot] = key_hash ^ (int(value) & 0xFFFFFFFFFFFFFFFF)
+
+    def stats(self):
+        """
+        :return: dict with the hits, misses, hit rate and evictions of this process, the number of filled slots
+                 of all processes, the number of slots and the size of the shared memory
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions, "entries": int(np.count_nonzero(self.checks)), "slots": self.n_slots,
+                "bytes": self.shared.size}
+
+    def close(self):
+        """
+        Detaches from the shared memory, the creating process also releases it
+        """
+        # the arrays must not be used anymore
+        del self.values, self.checks, self.keys
+        self.shared.close()
+        if self.owner:
+            self.shared.unlink()
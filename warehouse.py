@@ -0,0 +1,353 @@
+"""Contains the parser for warehouse and order files and the compiled binary warehouse cache."""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+
+def read_order(path, item_index):
+    """
+    Retrieves the positions of the ordered items from the given file
+
+    :param path: file path
+    :param item_index: dict from item to its position in the item list
+    :return: sorted array of the positions of all ordered items
+    """
+    with open(path) as f:
+        order_raw = f.read().split()
+
+    unknown = sum(item not in item_index for item in order_raw)
+    if unknown:
+        # only the number, the items could be the content of any file
+        raise KeyError(f"{unknown} unknown items in the order")
+
+    return np.unique(np.array([item_index[item] for item in order_raw], dtype=np.intp))
+
+
+def parse_warehouse(f, order_positions):
+    """
+    Reads the PSUs from an opened warehouse file, whose item line has already been consumed.
+    Only PSUs containing ordered items are kept, restricted to the ordered items.
+
+    :param f: opened warehouse file, positioned after the item line
+    :param order_positions: dict from ordered item to its column in the psu rows
+    :return: indptr, indices (CSR structure of the relevant psus), psu_nrs
+    """
+    indptr = [0]
+    indices = []
+    psu_nrs = []
+
+    # the line between the items and the psus is skipped
+    next(f, None)
+
+    for index, line in enumerate(f):
+        columns = [order_positions[item] for item in line.split() if item in order_positions]
+
+        if columns:
+            indices.extend(columns)
+            indptr.append(len(indices))
+            psu_nrs.append(index)
+
+    return np.asarray(indptr, dtype=np.intp), np.asarray(indices, dtype=np.intp), np.asarray(psu_nrs, dtype=np.intp)
+
+
+def csr_to_dense(indptr, indices, n_columns):
+    """
+    Converts rows in CSR structure to a 2D binary array
+
+    :param indptr: start of every row in indices, plus the end of the last row
+    :param indices: column positions of all rows
+    :param n_columns: number of columns
+    :return: 2D binary array
+    """
+    dense = np.zeros((len(indptr) - 1, n_columns), dtype=bool)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    dense[rows, indices] = True
+
+    return dense
+
+
+def read_problem(warehouse_path, order_path, cache=False):
+    """
+    Reads a warehouse and an order in a single pass over the warehouse file
+
+    :param warehouse_path: path of the warehouse file
+    :param order_path: path of the order file
+    :param cache: load the warehouse from its compiled binary cache instead, see Warehouse
+    :return: list of items, binary representation of the order, 2D array containing the relevant psus
+             (restricted to the ordered items) and the psu-nrs of the relevant psus
+    """
+    if cache:
+        warehouse = Warehouse.load(warehouse_path)
+        return warehouse.problem(warehouse.read_order(order_path))
+
+    with open(warehouse_path) as f:
+        items = f.readline().split()
+        item_index = {item: index for index, item in enumerate(items)}
+
+        order_index = read_order(order_path, item_index)
+        order_positions = {items[index]: column for column, index in enumerate(order_index)}
+
+        indptr, indices, psu_nrs = parse_warehouse(f, order_positions)
+
+    order = np.zeros(len(items), dtype=bool)
+    order[order_index] = True
+
+    psus = csr_to_dense(indptr, indices, len(order_index))
+
+    return items, order, psus, psu_nrs
+
+
+class Warehouse():
+    """
+    All items and PSUs of a warehouse file. The PSUs are stored in CSR structure (indptr, indices) over the item
+    positions, together with the inverted index from every item to the PSUs that contain it (item_indptr, item_psus).
+    A warehouse can be compiled to a binary cache, which later runs load memory-mapped instead of parsing the text
+    file again.
+    """
+
+    # name of the cache directory, created next to the warehouse file
+    cache_directory = ".warehouse_cache"
+
+    # arrays stored in the binary cache
+    array_names = ("items", "indptr", "indices", "item_order", "item_indptr", "item_psus")
+
+    def __init__(self, items, indptr, indices, item_order=None, item_indptr=None, item_psus=None):
+        """
+        :param items: array of all items
+        :param indptr: start of every psu in indices, plus the end of the last psu
+        :param indices: item positions of all psus
+        :param item_order: permutation that sorts the items, used for looking up items
+        :param item_indptr: start of every item in item_psus, plus the end of the last item
+        :param item_psus: psu-nrs of the psus containing each item, built from the psus if not given
+        """
+        self.items = items
+        self.indptr = indptr
+        self.indices = indices
+        self.item_order = np.argsort(items) if item_order is None else item_order
+
+        if item_indptr is None or item_psus is None:
+            # the psus of the entries sorted by item are the inverted index
+            entry_psus = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+            item_psus = entry_psus[np.argsort(indices, kind="stable")]
+            item_indptr = np.zeros(len(items) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(indices, minlength=len(items)), out=item_indptr[1:])
+
+        self.item_indptr = item_indptr
+        self.item_psus = item_psus
+
+    @classmethod
+    def parse(cls, path):
+        """
+        Reads all items and PSUs from a warehouse file
+
+        :param path: file path
+        :return: Warehouse
+        """
+        with open(path) as f:
+            items = f.readline().split()
+            item_index = {item: index for index, item in enumerate(items)}
+
+            indptr = [0]
+            indices = []
+
+            # the line between the items and the psus is skipped
+            next(f, None)
+
+            for line in f:
+                line_items = line.split()
+                try:
+                    indices.extend(item_index[item] for item in line_items)
+                except KeyError:
+                    # only the number, the items could be the content of any file
+                    unknown = sum(item not in item_index for item in line_items)
+                    raise KeyError(f"{unknown} unknown items in PSU {len(indptr) - 1}") from None
+                indptr.append(len(indices))
+
+        return cls(np.array(items), np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int32))
+
+    @classmethod
+    def load(cls, path, cache=True):
+        """
+        Loads a warehouse file. If cache is set, the compiled binary version is used, which is created first if the
+        file is new or was changed since it was compiled. If the cache can't be written, e.g. in a read-only
+        directory, the parsed text file is used.
+
+        :param path: file path
+        :param cache: use the compiled binary cache
+        :return: Warehouse
+        """
+        if not cache:
+            return cls.parse(path)
+
+        directory = cls.cache_path(path)
+        files = [os.path.join(directory, name + ".npy") for name in cls.array_names]
+
+        if not all(os.path.isfile(file) for file in files):
+            warehouse = cls.parse(path)
+            try:
+                # caches compiled by older versions miss arrays
+                shutil.rmtree(directory, ignore_errors=True)
+                warehouse.compile(directory)
+            except OSError:
+                return warehouse
+
+        arrays = {name: np.load(file, mmap_mode='r') for name, file in zip(cls.array_names, files)}
+
+        return cls(**arrays)
+
+    @classmethod
+    def cache_path(cls, path):
+        """
+        Returns the cache directory of a warehouse file, keyed by the hash of the file's content. The hash is stored
+        with the file's size and modification time in a stamp file and only computed again when they changed.
+
+        :param path: file path
+        :return: directory path
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        parent = os.path.join(directory, cls.cache_directory)
+        stamp_path = os.path.join(parent, name + ".stamp")
+
+        stat = os.stat(path)
+        stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+
+        try:
+            with open(stamp_path) as f:
+                stamped, file_hash = f.read().rsplit(" ", 1)
+            if stamped == stamp:
+                return os.path.join(parent, f"{name}-{file_hash}")
+        except (OSError, ValueError):
+            pass
+
+        file_hash = hashlib.sha1()
+
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+
+        file_hash = file_hash.hexdigest()
+
+        # written to a temporary file first, so that other processes never read an incomplete stamp
+        # without a writable directory there is no stamp, the hash is computed on every load
+        try:
+            os.makedirs(parent, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=parent)
+            with os.fdopen(handle, "w") as f:
+                f.write(f"{stamp} {file_hash}")
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, stamp_path)
+        except OSError:
+            pass
+
+        return os.path.join(parent, f"{name}-{file_hash}")
+
+    def compile(self, directory):
+        """
+        Writes the warehouse to a binary cache directory and removes outdated caches of the same file
+
+        :param directory: cache directory, see cache_path
+        """
+        parent, name = os.path.split(directory)
+        os.makedirs(parent, exist_ok=True)
+
+        # write to a temporary directory first, so that other processes never see an incomplete cache
+        temp_directory = tempfile.mkdtemp(dir=parent)
+        # mkdtemp only allows the owner, the cache is shared with the other users of the warehouse file
+        os.chmod(temp_directory, 0o755)
+
+        try:
+            for array_name in self.array_names:
+                np.save(os.path.join(temp_directory, array_name + ".npy"), getattr(self, array_name))
+        except OSError:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(temp_directory, directory)
+        except OSError:
+            # another process compiled the same file in the meantime
+            shutil.rmtree(temp_directory)
+
+        source = name.rsplit("-", 1)[0]
+        for outdated in os.listdir(parent):
+            if outdated.rsplit("-", 1)[0] == source and outdated != name \
+                    and os.path.isdir(os.path.join(parent, outdated)):
+                shutil.rmtree(os.path.join(parent, outdated), ignore_errors=True)
+
+    def item_positions(self, order_raw):
+        """
+        Looks up the positions of items
+
+        :param order_raw: list of item names
+        :return: array of item positions
+        """
+        order_raw = np.asarray(order_raw, dtype=str)
+        sorted_positions = np.searchsorted(self.items, order_raw, sorter=self.item_order)
+        positions = self.item_order[np.minimum(sorted_positions, len(self.items) - 1)]
+
+        unknown = np.count_nonzero(self.items[positions] != order_raw)
+        if unknown:
+            # only the number, the items could be the content of any file
+            raise KeyError(f"{unknown} unknown items in the order")
+
+        return positions
+
+    def read_order(self, path):
+        """
+        Retrieves the positions of the ordered items from the given file
+
+        :param path: file path
+        :return: sorted array of the positions of all ordered items
+        """
+        with open(path) as f:
+            order_raw = f.read().split()
+
+        return np.unique(self.item_positions(order_raw))
+
+    def order_problem(self, order_raw):
+        """
+        Extracts the problem of an order given as a list of items, see problem
+
+        :param order_raw: list of ordered items
+        :return: array of items, binary representation of the order, 2D array containing the relevant psus
+                 and the psu-nrs of the relevant psus
+        """
+        return self.problem(np.unique(self.item_positions(order_raw)))
+
+    def problem(self, order_index):
+        """
+        Extracts the PSUs that contain ordered items, restricted to the ordered items. Only the postings of the
+        ordered items in the inverted index are read, not the whole warehouse.
+
+        :param order_index: sorted array of the positions of all ordered items
+        :return: array of items, binary representation of the order, 2D array containing the relevant psus
+                 and the psu-nrs of the relevant psus
+        """
+        starts = self.item_indptr[order_index]
+        lengths = self.item_indptr[np.asarray(order_index) + 1] - starts
+
+        # positions of all postings of the ordered items in item_psus, and the column of each posting
+        posting_offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(np.sum(lengths))
+        hit_psus = self.item_psus[posting_offsets]
+        hit_columns = np.repeat(np.arange(len(order_index)), lengths)
+
+        psu_nrs = np.unique(hit_psus).astype(np.intp)
+        psus = np.zeros((len(psu_nrs), len(order_index)), dtype=bool)
+        psus[np.searchsorted(psu_nrs, hit_psus), hit_columns] = True
+
+        order = np.zeros(len(self.items), dtype=bool)
+        order[order_index] = True
+
+        return self.items, order, psus, psu_nrs
+
+
+if __name__ == '__main__':
+    # compiles the given warehouse files to their binary cache
+    for warehouse_path in sys.argv[1:]:
+        Warehouse.load(warehouse_path)
+        print("compiled", warehouse_path, "to", Warehouse.cache_path(warehouse_path))